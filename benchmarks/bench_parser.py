@@ -0,0 +1,82 @@
+"""Мікробенчмарк парсера відповідей availability на записаних фікстурах
+
+    python -m benchmarks.bench_parser [--repeat 2000]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from management.flight import get_flight_link
+from management.parser import parse_availability, _loads
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def legacy_parse(body, origin="BER", destination="XXX"):
+    """The nested walk get_cheap_flights used before the shared parser"""
+    data = json.loads(body)
+    flights = []
+    if "trips" in data and len(data["trips"]) > 0:
+        for trip in data["trips"]:
+            if "dates" in trip and len(trip["dates"]) > 0:
+                for date_item in trip["dates"]:
+                    if "flights" in date_item and len(date_item["flights"]) > 0:
+                        for flight in date_item["flights"]:
+                            if "regularFare" in flight and "fares" in flight["regularFare"]:
+                                price = float(flight["regularFare"]["fares"][0]["amount"])
+                                departure_date = flight["time"][0]
+                                flights.append({
+                                    "destination": destination,
+                                    "price": price,
+                                    "date": departure_date,
+                                    "link": get_flight_link(origin, destination, departure_date)
+                                })
+    return flights
+
+
+def measure(parse, body, repeat):
+    seconds = min(timeit.repeat(lambda: parse(body), number=repeat, repeat=3)) / repeat
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = parse(body)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    retained = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+
+    return {
+        "us_per_response": round(seconds * 1e6, 1),
+        "peak_kib": round(peak / 1024, 1),
+        "retained_blocks": retained,
+        "flights": len(result),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк парсера availability")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    report = {"json_backend": getattr(_loads, "__module__", "json"), "fixtures": {}}
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        if not name.startswith("availability_"):
+            continue
+        with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+            body = f.read()
+        report["fixtures"][name] = {
+            "bytes": len(body),
+            "legacy": measure(legacy_parse, body, args.repeat),
+            "parse_availability": measure(lambda b: parse_availability(b, "BER", "XXX"), body, args.repeat),
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
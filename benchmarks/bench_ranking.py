@@ -0,0 +1,125 @@
+"""Бенчмарк ранжування тарифів: чистий Python проти матриці NumPy
+
+Генерує синтетичні тарифи для 20, 200 і 2000 напрямків на SEARCH_DAYS днів
+і вимірює побудову та запити (мінімум по напрямках, top-k, перцентилі) для
+потокового агрегатора, PythonFareMatrix і NumpyFareMatrix. Без NumPy його
+колонки у звіті порожні.
+
+    python -m benchmarks.bench_ranking [--sizes 20 200 2000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from management.aggregate import CheapestPerDestination
+from management.destinations import Destination
+from management.fare_matrix import NumpyFareMatrix, PythonFareMatrix, np
+from management.flight import Flight
+
+SEARCH_DAYS = 90
+QUERY_DAYS = 30
+TOP_K = 10
+
+
+def synthetic_fares(count, first_day, seed):
+    """Destinations and per-destination responses with 0-3 flights a day"""
+    rng = random.Random(seed)
+    destinations = [Destination(f"D{number:04d}", f"Місто {number}") for number in range(count)]
+    responses = []
+    midnight = datetime.combine(first_day, datetime.min.time())
+    for dest in destinations:
+        base = rng.uniform(15, 150)
+        flights = [
+            Flight("BER", dest.code, midnight + timedelta(days=day, minutes=rng.randrange(360, 1380)),
+                   round(base * rng.uniform(0.6, 1.8), 2))
+            for day in range(SEARCH_DAYS) for _ in range(rng.choice((0, 1, 1, 2, 3)))
+        ]
+        responses.append(flights)
+    return destinations, responses
+
+
+def best_time(func, repeat):
+    number = max(1, repeat)
+    return round(min(timeit.repeat(func, number=number, repeat=3)) / number * 1e3, 3)
+
+
+def bench_aggregator(responses, first_day, last_day, repeat):
+    """Today's path: one aggregator per query, fed with every response"""
+    def cheapest():
+        aggregator = CheapestPerDestination(first_day, last_day)
+        for flights in responses:
+            aggregator.add(flights)
+        return aggregator.results()
+
+    def top():
+        return cheapest()[:TOP_K]
+
+    def percentiles():
+        prices = sorted(flight.price for flights in responses for flight in flights
+                        if first_day <= flight.departure.date() <= last_day)
+        return [prices[int((len(prices) - 1) * q / 100)] for q in (10, 50, 90)]
+
+    return {
+        "build_ms": 0.0,
+        "cheapest_ms": best_time(cheapest, repeat),
+        "top_k_ms": best_time(top, repeat),
+        "percentiles_ms": best_time(percentiles, repeat),
+    }
+
+
+def bench_matrix(matrix_class, destinations, responses, first_day, last_day, repeat):
+    def build():
+        matrix = matrix_class(destinations, first_day, SEARCH_DAYS)
+        for flights in responses:
+            matrix.add(flights)
+        # The first query merges what NumpyFareMatrix buffered, so it counts towards the build
+        matrix.top(1)
+        return matrix
+
+    matrix = build()
+    return {
+        "build_ms": best_time(build, repeat),
+        "cheapest_ms": best_time(lambda: matrix.cheapest(first_day, last_day), repeat),
+        "top_k_ms": best_time(lambda: matrix.top(TOP_K, first_day, last_day), repeat),
+        "percentiles_ms": best_time(lambda: matrix.percentiles((10, 50, 90), first_day, last_day), repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк ранжування тарифів")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 200, 2000], help="Кількість напрямків")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    first_day = date.today()
+    query_first = first_day + timedelta(days=10)
+    query_last = query_first + timedelta(days=QUERY_DAYS - 1)
+
+    report = {"numpy": np.__version__ if np is not None else None, "days": SEARCH_DAYS,
+              "query_days": QUERY_DAYS, "top_k": TOP_K, "sizes": {}}
+    for size in args.sizes:
+        destinations, responses = synthetic_fares(size, first_day, args.seed)
+        repeat = max(1, args.repeat * 20 // size)
+        result = {
+            "flights": sum(len(flights) for flights in responses),
+            "aggregator": bench_aggregator(responses, query_first, query_last, repeat),
+            "python_matrix": bench_matrix(PythonFareMatrix, destinations, responses, query_first, query_last, repeat),
+            "numpy_matrix": None,
+        }
+        if np is not None:
+            result["numpy_matrix"] = bench_matrix(NumpyFareMatrix, destinations, responses,
+                                                  query_first, query_last, repeat)
+        report["sizes"][size] = result
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Офлайн бенчмарк пошуку проти локальної заглушки Ryanair API
+
+Запускає StubRyanair у тому ж процесі, спрямовує на неї клієнт через
+RYANAIR_API_URL і виконує find_cheapest_flights_from_berlin_async для кожного
+періоду з SEARCH_PERIODS та search_all_cities_for_date_async. Звіт у JSON:
+час, кількість запитів до API (окремо по ендпоінтах), p50/p95 та пікова пам'ять.
+
+    python -m benchmarks.bench_search --repeat 3 --latency 0.1 --conflict-rate 0.05 --rate 20
+    python -m benchmarks.bench_search --backend calendar --only period_month period_three_months
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import StubRyanair, add_stub_arguments, stub_from_args
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile, None for an empty sample"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def summarize(seconds):
+    return {
+        "p50": round(percentile(seconds, 50), 4) if seconds else None,
+        "p95": round(percentile(seconds, 95), 4) if seconds else None,
+        "max": round(max(seconds), 4) if seconds else None,
+    }
+
+
+async def run_scenario(stub: StubRyanair, search, repeat: int, warm: bool, verbose: bool):
+    """Runs one search repeat times and collects timings from both sides"""
+    from management.cache import fare_cache
+    from management.fare_index import fare_index, calendar_index
+
+    wall_times = []
+    results = 0
+    stub.reset()
+    tracemalloc.reset_peak()
+    with open(os.devnull, "w") as devnull:
+        for _ in range(repeat):
+            if not warm:
+                fare_cache.clear()
+                fare_index.clear()
+                calendar_index.clear()
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(sys.stdout if verbose else devnull):
+                found = await search()
+            wall_times.append(time.perf_counter() - started)
+            results = len(found)
+    _, peak = tracemalloc.get_traced_memory()
+
+    return {
+        "runs": repeat,
+        "results": results,
+        "wall_seconds": summarize(wall_times),
+        "upstream": {
+            **stub.stats(),
+            "per_run": round(stub.requests / repeat, 1),
+            "latency_seconds": summarize(stub.latencies),
+        },
+        "peak_memory_kib": round(peak / 1024, 1),
+    }
+
+
+async def run(args):
+    stub = stub_from_args(args)
+    base_url = await stub.start(port=args.port)
+
+    # The client reads its settings at import time, so configure it first
+    os.environ["RYANAIR_API_URL"] = base_url
+    os.environ["FARE_STORE_PATH"] = ""
+    os.environ["UPSTREAM_REQUEST_TIMEOUT"] = str(args.client_timeout)
+    os.environ["UPSTREAM_BACKEND"] = args.backend
+    if args.rate is not None:
+        os.environ["UPSTREAM_RATE"] = str(args.rate)
+    if args.retry_backoff is not None:
+        os.environ["UPSTREAM_RETRY_BACKOFF"] = str(args.retry_backoff)
+
+    from configs.config import SEARCH_PERIODS, UPSTREAM_RATE
+    from management.http import start_http_session, close_http_session
+    from management.main import find_cheapest_flights_from_berlin_async, search_all_cities_for_date_async
+    from management.tracing import tracer
+
+    if args.trace:
+        tracer.enable(args.trace)
+
+    today = datetime.now()
+    search_date = (today + timedelta(days=args.date_offset)).strftime("%Y-%m-%d")
+    scenarios = {}
+    for name, days in SEARCH_PERIODS.items():
+        date_from = today.strftime("%Y-%m-%d")
+        date_to = (today + timedelta(days=days)).strftime("%Y-%m-%d")
+        scenarios[f"period_{name}"] = lambda date_from=date_from, date_to=date_to: \
+            find_cheapest_flights_from_berlin_async(date_from, date_to)
+    scenarios["all_cities_for_date"] = lambda: search_all_cities_for_date_async(search_date)
+
+    report = {
+        "config": {
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "conflict_rate": args.conflict_rate,
+            "timeout_rate": args.timeout_rate,
+            "client_timeout": args.client_timeout,
+            "upstream_rate": UPSTREAM_RATE,
+            "backend": args.backend,
+            "repeat": args.repeat,
+            "warm": args.warm,
+        },
+        "scenarios": {},
+    }
+
+    tracemalloc.start()
+    await start_http_session()
+    try:
+        for name, search in scenarios.items():
+            if args.only and name not in args.only:
+                continue
+            report["scenarios"][name] = await run_scenario(stub, search, args.repeat, args.warm, args.verbose)
+    finally:
+        await tracer.drain()
+        await close_http_session()
+        await stub.stop()
+        tracemalloc.stop()
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн бенчмарк пошуку рейсів")
+    parser.add_argument("--repeat", type=int, default=3, help="Скільки разів запускати кожен сценарій")
+    parser.add_argument("--port", type=int, default=0, help="Порт заглушки, 0 - будь-який вільний")
+    parser.add_argument("--client-timeout", type=float, default=2.0, help="UPSTREAM_REQUEST_TIMEOUT клієнта, секунди")
+    parser.add_argument("--rate", type=float, default=None, help="UPSTREAM_RATE, за замовчуванням з конфігу")
+    parser.add_argument("--retry-backoff", type=float, default=None, help="UPSTREAM_RETRY_BACKOFF, за замовчуванням з конфігу")
+    parser.add_argument("--backend", choices=("availability", "calendar"), default="availability",
+                        help="UPSTREAM_BACKEND для пошуку за період")
+    parser.add_argument("--date-offset", type=int, default=7, help="Через скільки днів дата для пошуку по всіх містах")
+    parser.add_argument("--warm", action="store_true", help="Не очищати кеш і індекс тарифів між запусками")
+    parser.add_argument("--only", nargs="*", help="Запустити лише ці сценарії")
+    parser.add_argument("--output", help="Записати звіт у файл замість stdout")
+    parser.add_argument("--verbose", action="store_true", help="Показувати лог пошуку")
+    parser.add_argument("--trace", help="Записати Chrome trace пошуків у цей файл")
+    add_stub_arguments(parser)
+    parser.set_defaults(timeout_delay=5.0)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
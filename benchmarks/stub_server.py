@@ -0,0 +1,243 @@
+"""Локальна заглушка Ryanair API для офлайн-бенчмарків
+
+Відповідає на /api/booking/v4/en-gb/availability записаними фікстурами
+(benchmarks/fixtures/availability_<ORIGIN>_<DEST>*.json) або синтетичними
+відповідями тієї ж форми, а на місячний календар
+/api/farfnd/v4/oneWayFares/<ORIGIN>/<DEST>/cheapestPerDay - найдешевшим
+синтетичним рейсом кожного дня. Затримку, частку 409 та таймаутів можна задати.
+
+    python -m benchmarks.stub_server --port 8765 --latency 0.2 --conflict-rate 0.05
+    RYANAIR_API_URL=http://127.0.0.1:8765 python run_bot.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from aiohttp import web
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+AVAILABILITY_PATH = "/api/booking/v4/en-gb/availability"
+CHEAPEST_PER_DAY_PATH = "/api/farfnd/v4/oneWayFares/{origin}/{destination}/cheapestPerDay"
+
+
+class StubRyanair:
+    """aiohttp app that imitates the availability and month fare calendar endpoints
+
+    Synthetic fares are stable per route and day, so both endpoints agree on
+    the cheapest fare of a day.
+
+    Args:
+        latency: seconds before every response
+        jitter: extra random latency, uniform in [0, jitter]
+        conflict_rate: share of requests answered with HTTP 409
+        timeout_rate: share of requests that hang for timeout_delay seconds
+        timeout_delay: how long a "timed out" request hangs, should exceed the client timeout
+        fixtures_dir: directory with recorded responses, None serves synthetic ones only
+        seed: seed for the injected faults and synthetic fares
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, conflict_rate: float = 0.0,
+                 timeout_rate: float = 0.0, timeout_delay: float = 30.0, fixtures_dir=None, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.conflict_rate = conflict_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_delay = timeout_delay
+        self.seed = seed
+        self._random = random.Random(seed)
+        self._fixtures = self._load_fixtures(fixtures_dir) if fixtures_dir else {}
+        self._runner = None
+        self.reset()
+
+    def reset(self):
+        """Clears the request counters and latency samples"""
+        self.requests = 0
+        self.statuses = {}
+        self.endpoints = {}
+        self.latencies = []
+
+    def stats(self):
+        return {"requests": self.requests, "statuses": dict(self.statuses), "endpoints": dict(self.endpoints)}
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(AVAILABILITY_PATH, self.handle_availability)
+        app.router.add_get(CHEAPEST_PER_DAY_PATH, self.handle_cheapest_per_day)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Starts the server in the running loop and returns its base URL"""
+        self._runner = web.AppRunner(self.make_app(), access_log=None, handler_cancellation=True)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle_availability(self, request: web.Request) -> web.Response:
+        def respond():
+            query = request.query
+            body = self._fixtures.get((query.get("Origin", ""), query.get("Destination", "")))
+            if body is None:
+                body = json.dumps(self.synthetic_response(
+                    query.get("Origin", ""), query.get("Destination", ""), query.get("DateOut", "")[:10],
+                    int(query.get("FlexDaysBeforeOut", 2)), int(query.get("FlexDaysOut", 2))
+                )).encode()
+            return body
+
+        return await self._serve("availability", respond)
+
+    async def handle_cheapest_per_day(self, request: web.Request) -> web.Response:
+        def respond():
+            return json.dumps(self.synthetic_month(
+                request.match_info["origin"], request.match_info["destination"],
+                request.query.get("outboundMonthOfDate", "")[:10]
+            )).encode()
+
+        return await self._serve("cheapest_per_day", respond)
+
+    async def _serve(self, endpoint, respond):
+        """Applies the latency and injected faults, then answers with the body respond() builds"""
+        started = time.perf_counter()
+        self.requests += 1
+        self.endpoints[endpoint] = self.endpoints.get(endpoint, 0) + 1
+        try:
+            roll = self._random.random()
+            if roll < self.timeout_rate:
+                self._count("timeout")
+                await asyncio.sleep(self.timeout_delay)
+                return web.Response(status=504)
+
+            await asyncio.sleep(self.latency + self._random.uniform(0, self.jitter))
+            if roll < self.timeout_rate + self.conflict_rate:
+                self._count(409)
+                return web.json_response({"message": "Availability declined"}, status=409)
+
+            body = respond()
+            self._count(200)
+            return web.Response(body=body, content_type="application/json")
+        finally:
+            self.latencies.append(time.perf_counter() - started)
+
+    def synthetic_response(self, origin, destination, date_out, flex_before, flex_after):
+        """Builds a response with 0-3 flights per day and stable prices per route and day"""
+        try:
+            day = datetime.strptime(date_out, "%Y-%m-%d")
+        except ValueError:
+            return {"trips": []}
+
+        dates = []
+        for offset in range(-flex_before, flex_after + 1):
+            current = day + timedelta(days=offset)
+            flights = self._synthetic_flights(origin, destination, current)
+            dates.append({"dateOut": f"{current:%Y-%m-%d}T00:00:00.000", "flights": flights})
+
+        return {
+            "currency": "EUR",
+            "trips": [{"origin": origin, "destination": destination, "dates": dates}],
+            "serverTimeUTC": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        }
+
+    def synthetic_month(self, origin, destination, month_of_date):
+        """Builds a cheapestPerDay response: the cheapest bookable synthetic flight of every day of the month"""
+        try:
+            first = datetime.strptime(month_of_date, "%Y-%m-%d").replace(day=1)
+        except ValueError:
+            return {"outbound": {"fares": []}}
+
+        fares = []
+        current = first
+        while current.month == first.month:
+            bookable = [flight for flight in self._synthetic_flights(origin, destination, current)
+                        if flight["faresLeft"] != 0]
+            cheapest = min(bookable, key=lambda flight: flight["regularFare"]["fares"][0]["amount"], default=None)
+            fares.append({
+                "day": f"{current:%Y-%m-%d}",
+                "departureDate": cheapest["time"][0][:19] if cheapest else None,
+                "arrivalDate": cheapest["time"][1][:19] if cheapest else None,
+                "price": {"value": cheapest["regularFare"]["fares"][0]["amount"], "currencyCode": "EUR"}
+                if cheapest else None,
+                "soldOut": False,
+                "unavailable": cheapest is None,
+            })
+            current += timedelta(days=1)
+        return {"outbound": {"fares": fares}}
+
+    def _synthetic_flights(self, origin, destination, day):
+        """0-3 flights with stable times and prices per route and day"""
+        rnd = random.Random(f"{self.seed}:{origin}:{destination}:{day:%Y-%m-%d}")
+        flights = []
+        for _ in range(rnd.randint(0, 3)):
+            departure = day.replace(hour=rnd.randint(6, 21), minute=rnd.choice((0, 15, 30, 45)))
+            arrival = departure + timedelta(minutes=rnd.randint(60, 240))
+            amount = round(rnd.uniform(9.99, 180.0), 2)
+            flights.append({
+                "faresLeft": rnd.choice((-1, 1, 2, 4, 0)),
+                "flightNumber": f"FR {rnd.randint(100, 9999)}",
+                "time": [f"{departure:%Y-%m-%dT%H:%M:%S}.000", f"{arrival:%Y-%m-%dT%H:%M:%S}.000"],
+                "regularFare": {"fareClass": "H", "fares": [{"type": "ADT", "amount": amount, "count": 1}]},
+            })
+        return flights
+
+    def _count(self, status):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    @staticmethod
+    def _load_fixtures(fixtures_dir):
+        fixtures = {}
+        if not os.path.isdir(fixtures_dir):
+            return fixtures
+        for name in sorted(os.listdir(fixtures_dir)):
+            if not name.startswith("availability_") or not name.endswith(".json"):
+                continue
+            parts = name[len("availability_"):-len(".json")].split("_")
+            if len(parts) < 2:
+                continue
+            with open(os.path.join(fixtures_dir, name), "rb") as f:
+                fixtures.setdefault((parts[0], parts[1]), f.read())
+        return fixtures
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=0.05, help="Затримка відповіді, секунди")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Додаткова випадкова затримка, секунди")
+    parser.add_argument("--conflict-rate", type=float, default=0.0, help="Частка відповідей 409")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Частка запитів, що зависають")
+    parser.add_argument("--timeout-delay", type=float, default=30.0, help="Скільки висить запит, що завис")
+    parser.add_argument("--fixtures", action="store_true", help="Віддавати записані фікстури для маршрутів, де вони є")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def stub_from_args(args) -> StubRyanair:
+    return StubRyanair(
+        latency=args.latency,
+        jitter=args.jitter,
+        conflict_rate=args.conflict_rate,
+        timeout_rate=args.timeout_rate,
+        timeout_delay=args.timeout_delay,
+        fixtures_dir=FIXTURES_DIR if args.fixtures else None,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальна заглушка Ryanair API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    web.run_app(stub_from_args(args).make_app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,24 @@ import asyncio
 from aiogram import Bot, Dispatcher, types
 from aiogram.filters import Command
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
-from datetime import datetime, timedelta
-from configs.config import TELEGRAM_BOT_TOKEN, SEARCH_PERIODS
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from configs.config import TELEGRAM_BOT_TOKEN, SEARCH_PERIODS, CALENDAR_HEATMAP, CALENDAR_HEATMAP_MAX_AGE
 from management.main import (
-    get_cheap_flights,
-    get_popular_destinations_from_berlin,
+    get_cheap_flights_async,
     find_cheapest_flights_from_berlin,
     find_cheapest_flights_from_berlin_async,
-    search_all_cities_for_date_async
+    iter_cheapest_flights_from_berlin_async,
+    iter_all_cities_for_date_async
 )
 from management.calendar_factory import CalendarMarkup, CalendarCallbackFactory
+from management.progress import ThrottledEditor
+from management.aggregate import CheapestPerDestination
+from management.sessions import Session, SessionStore
+from management.destinations import destination_registry
+from management.fare_index import fare_index
+from management.render import format_flight, paginate, page_keyboard, PAGE_CALLBACK_PREFIX
+from management.metrics import metrics, search_duration
 import logging
 
 bot = Bot(token=TELEGRAM_BOT_TOKEN)
@@ -19,8 +27,11 @@ dp = Dispatcher()
 
 calendar = CalendarMarkup()
 
-user_data = {}
+user_sessions = SessionStore()
+metrics.gauge("flightbot_user_sessions", "Users with a stored search session", user_sessions.live_count)
 
+# Static keyboards are built on first use and then reused for every message
+@lru_cache(maxsize=None)
 def create_main_keyboard():
     keyboard = [
         [KeyboardButton(text="🔍 Найдешевші рейси")],
@@ -29,6 +40,7 @@ def create_main_keyboard():
     ]
     return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
 
+@lru_cache(maxsize=None)
 def create_period_keyboard():
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [
@@ -39,15 +51,15 @@ def create_period_keyboard():
     ])
     return keyboard
 
+@lru_cache(maxsize=None)
 def create_cities_keyboard():
     """Creates a keyboard with cities"""
-    destinations = get_popular_destinations_from_berlin()
     buttons = []
     row = []
-    for dest in destinations:
+    for dest in destination_registry:
         row.append(InlineKeyboardButton(
-            text=dest["city"],
-            callback_data=f"city_{dest['code']}"
+            text=dest.city,
+            callback_data=f"city_{dest.code}"
         ))
         if len(row) == 2:
             buttons.append(row)
@@ -56,6 +68,56 @@ def create_cities_keyboard():
         buttons.append(row)
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+def format_progress(title, cheapest, total, top=5):
+    """Builds a progress message with the running top list of cheapest cities"""
+    ranked = cheapest.results()[:top]
+    lines = [title, f"Знайдено міст: {len(cheapest)}/{total}"]
+    if ranked:
+        lines.append("")
+    for i, flight in enumerate(ranked, 1):
+        flight_date = flight.departure.strftime('%d.%m')
+        lines.append(f"{i}. {flight.city}: {flight.price}€ ({flight_date})")
+    return "\n".join(lines)
+
+def create_fare_calendar(session, year=None, month=None):
+    """Calendar for the session's search with the cheapest already fetched fare per day
+
+    Reads only the fare index, opening or flipping the calendar never calls
+    the API. Falls back to the plain calendar without a search in the session.
+    """
+    if not CALENDAR_HEATMAP or session is None or (session.search_type == "specific_city" and not session.city):
+        return calendar.create_calendar(year, month)
+
+    today = date.today()
+    year = year or today.year
+    month = month or today.month
+    first_day = date(year, month, 1)
+    last_day = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    # The all-cities search shows the cheapest fare to any destination
+    destination = session.city if session.search_type == "specific_city" else None
+    prices = fare_index.day_prices(destination_registry.origin, destination, first_day, last_day,
+                                   max_age=CALENDAR_HEATMAP_MAX_AGE)
+    return calendar.create_calendar(year, month, today=today, prices=prices)
+
+def render_result_pages(session):
+    return paginate(session.results_header,
+                    [format_flight(flight, show_city=session.results_show_city) for flight in session.results])
+
+async def show_result_pages(message: types.Message, user_id, header, flights, show_city=True):
+    """Shows the first page of a result and keeps the flights for the page buttons"""
+    session = user_sessions.get_or_create(user_id)
+    session.results = tuple(flights)
+    session.results_header = header
+    session.results_show_city = show_city
+    session.results_message_id = message.message_id
+    pages = render_result_pages(session)
+    await message.edit_text(
+        pages[0],
+        parse_mode="Markdown",
+        disable_web_page_preview=True,
+        reply_markup=page_keyboard(0, len(pages))
+    )
+
 @dp.message(Command("start"))
 async def start_handler(message: types.Message):
     text = ("Вітаю! Я допоможу знайти дешеві рейси з Берліна.\n\n"
@@ -85,11 +147,12 @@ async def show_cities(message: types.Message):
 
 @dp.message(lambda message: message.text == "📅 Пошук на конкретну дату")
 async def show_date_search(message: types.Message):
-    await message.answer("Виберіть дату для пошуку найдешевших рейсів:",
-                        reply_markup=calendar.create_calendar())
-
     # Save an empty city code to indicate we're searching for all cities
-    user_data[message.from_user.id] = {"city": None, "search_type": "all_cities"}
+    session = Session(city=None, search_type="all_cities")
+    user_sessions.set(message.from_user.id, session)
+
+    await message.answer("Виберіть дату для пошуку найдешевших рейсів:",
+                        reply_markup=create_fare_calendar(session))
 
 @dp.callback_query(lambda c: c.data.startswith('period_'))
 async def handle_period_selection(callback: types.CallbackQuery):
@@ -109,12 +172,20 @@ async def handle_period_selection(callback: types.CallbackQuery):
     date_from = today.strftime("%Y-%m-%d")
     date_to = end_date.strftime("%Y-%m-%d")
 
-    # Use the async function to find flights in parallel
+    # Stream results into the progress message as destinations resolve
     try:
         start_time = datetime.now()
-        flights = await find_cheapest_flights_from_berlin_async(date_from, date_to)
+        total = len(destination_registry)
+        progress = ThrottledEditor(progress_message)
+        cheapest = CheapestPerDestination()
+        async for flight in iter_cheapest_flights_from_berlin_async(date_from, date_to):
+            cheapest.offer(flight)
+            await progress.update(format_progress("🔄 Шукаю найдешевші рейси для кожного міста...",
+                                                  cheapest, total))
+        flights = cheapest.results()
         end_time = datetime.now()
         execution_time = (end_time - start_time).total_seconds()
+        search_duration.observe(execution_time, f"period_{period}")
         print(f"Flight search completed in {execution_time:.2f} seconds")
     except Exception as e:
         await callback.message.answer(f"Сталася помилка при пошуку: {e}")
@@ -133,42 +204,51 @@ async def handle_period_selection(callback: types.CallbackQuery):
     elif period == "three_months":
         period_text = f"найближчі 3 місяці"
 
-    response = f"🔥 Найдешевші рейси на {period_text} з Берліна:\n\n"
+    # All found flights (already sorted by price), split into pages that fit into a message
+    await show_result_pages(progress_message, callback.from_user.id,
+                            f"🔥 Найдешевші рейси на {period_text} з Берліна:\n\n", flights)
 
-    # Pass all found flights (already sorted by price)
-    for flight in flights:
-        # Format the date for better display
-        flight_date = datetime.strptime(flight['date'].split('T')[0], '%Y-%m-%d').strftime('%d.%m.%Y')
-        flight_time = flight['date'].split('T')[1][:5] if 'T' in flight['date'] else ""
-        time_info = f", {flight_time}" if flight_time else ""
+@dp.callback_query(lambda c: c.data.startswith('city_'))
+async def handle_city_selection(callback: types.CallbackQuery):
+    destination = destination_registry.by_code(callback.data.split('_')[1])
+    if destination is None:
+        await callback.answer("Цей напрямок більше недоступний", show_alert=True)
+        return
 
-        response += (f"🛫 {flight['city']}\n"
-                    f"💰 Ціна: {flight['price']}€\n"
-                    f"📅 Дата: {flight_date}{time_info}\n"
-                    f"🔗 [Забронювати]({flight['link']})\n\n")
+    # Save the selected city in memory
+    session = Session(city=destination.code, search_type="specific_city")
+    user_sessions.set(callback.from_user.id, session)
 
-    await progress_message.edit_text(
-        response,
-        parse_mode="Markdown",
-        disable_web_page_preview=True
+    await callback.answer()
+    await callback.message.edit_text(
+        f"Виберіть дату вильоту до міста {destination.city}:",
+        reply_markup=create_fare_calendar(session)
     )
 
-@dp.callback_query(lambda c: c.data.startswith('city_'))
-async def handle_city_selection(callback: types.CallbackQuery):
-    city_code = callback.data.split('_')[1]
+@dp.callback_query(lambda c: c.data.startswith(PAGE_CALLBACK_PREFIX))
+async def handle_result_page(callback: types.CallbackQuery):
+    """Flips a result page, rendered from the stored flights without searching again"""
+    session = user_sessions.get(callback.from_user.id)
+    try:
+        page = int(callback.data[len(PAGE_CALLBACK_PREFIX):])
+    except ValueError:
+        page = None
+    if (page is None or session is None or not session.results
+            or session.results_message_id != callback.message.message_id):
+        await callback.answer("Ці результати вже застаріли, повторіть пошук", show_alert=True)
+        return
+
+    pages = render_result_pages(session)
+    page = min(max(page, 0), len(pages) - 1)
 
     await callback.answer()
     await callback.message.edit_text(
-        "Виберіть дату початку пошуку:",
-        reply_markup=calendar.create_calendar()
+        pages[page],
+        parse_mode="Markdown",
+        disable_web_page_preview=True,
+        reply_markup=page_keyboard(page, len(pages))
     )
 
-    # Save the selected city in memory
-    user_data[callback.from_user.id] = {
-        "city": city_code,
-        "search_type": "specific_city"
-    }
-
 @dp.callback_query(CalendarCallbackFactory.filter())
 async def process_calendar(callback: types.CallbackQuery, callback_data: CalendarCallbackFactory):
     act = callback_data.act
@@ -184,16 +264,16 @@ async def process_calendar(callback: types.CallbackQuery, callback_data: Calenda
         # Get the selected date
         selected_date = datetime(year=year, month=month, day=day)
 
-        # Check that the date is not in the past
-        if selected_date < datetime.now():
+        # Past days are not selectable, but a keyboard sent on an earlier day still has them
+        if selected_date.date() < datetime.now().date():
             await callback.answer("Не можна вибрати дату в минулому!", show_alert=True)
             return
 
         # Get the saved user data
         user_id = callback.from_user.id
-        user_info = user_data.get(user_id, {})
-        city_code = user_info.get("city")
-        search_type = user_info.get("search_type", "specific_city")  # Default to specific city search
+        session = user_sessions.get(user_id) or Session()  # Default to specific city search
+        city_code = session.city
+        search_type = session.search_type
 
         # Send a progress message that can be updated
         progress_message = await callback.message.edit_text("🔄 Шукаю рейси...")
@@ -210,7 +290,7 @@ async def process_calendar(callback: types.CallbackQuery, callback_data: Calenda
                     await progress_message.edit_text("Помилка: місто не вибрано. Почніть спочатку.")
                     return
 
-                flights = get_cheap_flights(
+                flights = await get_cheap_flights_async(
                     "BER",
                     city_code,
                     date_str,
@@ -224,25 +304,27 @@ async def process_calendar(callback: types.CallbackQuery, callback_data: Calenda
                     )
                     return
 
-                response = f"Знайдені рейси на {selected_date.strftime('%d.%m.%Y')}:\n\n"
-
-                # Sort by price and take the 5 cheapest
-                sorted_flights = sorted(flights, key=lambda x: x['price'])[:5]
-
-                for flight in sorted_flights:
-                    flight_date = datetime.strptime(flight['date'].split('T')[0], '%Y-%m-%d').strftime('%d.%m.%Y')
-                    flight_time = flight['date'].split('T')[1][:5] if 'T' in flight['date'] else ""
-                    time_info = f", час: {flight_time}" if flight_time else ""
-
-                    response += (f"💰 Ціна: {flight['price']}€\n"
-                               f"📅 Дата: {flight_date}{time_info}\n"
-                               f"🔗 [Забронювати]({flight['link']})\n\n")
+                destination = destination_registry.by_code(city_code)
+                city_name = destination.city if destination is not None else city_code
+                # Sorted by price, cheapest first
+                header = f"Знайдені рейси до міста {city_name} на {selected_date.strftime('%d.%m.%Y')}:\n\n"
+                results = sorted(flights, key=lambda x: x.price)
+                show_city = False
             else:
                 # Search for cheapest flights to all cities on the selected date
                 await progress_message.edit_text(f"🔄 Шукаю найдешевші рейси на {selected_date.strftime('%d.%m.%Y')} до всіх міст...")
 
-                # Use the async function for parallel requests
-                sorted_flights = await search_all_cities_for_date_async(date_str)
+                # Stream results into the progress message as destinations resolve
+                total = len(destination_registry)
+                progress = ThrottledEditor(progress_message)
+                cheapest = CheapestPerDestination()
+                async for flight in iter_all_cities_for_date_async(date_str):
+                    cheapest.offer(flight)
+                    await progress.update(format_progress(
+                        f"🔄 Шукаю найдешевші рейси на {selected_date.strftime('%d.%m.%Y')} до всіх міст...",
+                        cheapest, total
+                    ))
+                sorted_flights = cheapest.results()
 
                 if not sorted_flights:
                     await progress_message.edit_text(
@@ -251,27 +333,16 @@ async def process_calendar(callback: types.CallbackQuery, callback_data: Calenda
                     )
                     return
 
-                response = f"🔥 Найдешевші рейси на {selected_date.strftime('%d.%m.%Y')} з Берліна:\n\n"
-
-                for flight in sorted_flights:
-                    flight_date = datetime.strptime(flight['date'].split('T')[0], '%Y-%m-%d').strftime('%d.%m.%Y')
-                    flight_time = flight['date'].split('T')[1][:5] if 'T' in flight['date'] else ""
-                    time_info = f", {flight_time}" if flight_time else ""
-
-                    response += (f"🛫 {flight['city']}\n"
-                               f"💰 Ціна: {flight['price']}€\n"
-                               f"📅 Дата: {flight_date}{time_info}\n"
-                               f"🔗 [Забронювати]({flight['link']})\n\n")
+                header = f"🔥 Найдешевші рейси на {selected_date.strftime('%d.%m.%Y')} з Берліна:\n\n"
+                results = sorted_flights
+                show_city = True
 
             end_time = datetime.now()
             execution_time = (end_time - start_time).total_seconds()
+            search_duration.observe(execution_time, search_type)
             print(f"Flight search completed in {execution_time:.2f} seconds")
 
-            await progress_message.edit_text(
-                response,
-                parse_mode="Markdown",
-                disable_web_page_preview=True
-            )
+            await show_result_pages(progress_message, user_id, header, results, show_city)
         except Exception as e:
             await progress_message.edit_text(f"Сталася помилка при пошуку: {e}")
             return
@@ -291,7 +362,7 @@ async def process_calendar(callback: types.CallbackQuery, callback_data: Calenda
                 month += 1
 
         await callback.message.edit_reply_markup(
-            reply_markup=calendar.create_calendar(year, month)
+            reply_markup=create_fare_calendar(user_sessions.get(callback.from_user.id), year, month)
         )
 
     await callback.answer()
@@ -302,7 +373,8 @@ async def handle_period_selection(message: types.Message):
     period = message.text.lower()
 
     # Save the selected period in user state
-    user_data[user_id]["period"] = period
+    session = user_sessions.get_or_create(user_id)
+    session.period = period
 
     # Calculate date range based on selected period
     today = datetime.now()
@@ -322,8 +394,8 @@ async def handle_period_selection(message: types.Message):
     date_to = date_to.strftime("%Y-%m-%d")
 
     # Store dates in user data
-    user_data[user_id]["date_from"] = date_from
-    user_data[user_id]["date_to"] = date_to
+    session.date_from = date_from
+    session.date_to = date_to
 
     # Log period and date range
     logging.info(f"User {user_id} selected period: {period}, searching from {date_from} to {date_to}")
@@ -332,7 +404,7 @@ async def handle_period_selection(message: types.Message):
     search_message = await message.answer("🔍 Шукаю найдешевші квитки з Берліна... Це може зайняти деякий час.")
 
     # Store the search message ID for later updates
-    user_data[user_id]["search_message_id"] = search_message.message_id
+    session.search_message_id = search_message.message_id
 
     try:
         # Use the period to determine how to search
@@ -350,7 +422,7 @@ async def handle_period_selection(message: types.Message):
             results = await find_cheapest_flights_from_berlin_async(date_from, date_to)
 
         # Sort results by price
-        results = sorted(results, key=lambda x: x["price"])
+        results = sorted(results, key=lambda x: x.price)
 
         # Get the top 5 cheapest flights
         top_5_flights = results[:5]
@@ -361,16 +433,14 @@ async def handle_period_selection(message: types.Message):
             message_text = f"🔥 Найдешевші квитки з Берліна за {period}:\n\n"
 
             for i, flight in enumerate(top_5_flights, 1):
-                # Extract the date without time
-                date_str = flight["date"].split("T")[0]
-                message_text += f"{i}. {flight['city']}: {flight['price']}€ ({date_str})\n"
-                message_text += f"   🔗 [Забронювати]({flight['link']})\n\n"
+                message_text += f"{i}. {flight.city}: {flight.price}€ ({flight.day})\n"
+                message_text += f"   🔗 [Забронювати]({flight.link})\n\n"
 
             # Update the previous search message with the results
             await bot.edit_message_text(
                 message_text,
                 chat_id=message.chat.id,
-                message_id=user_data[user_id]["search_message_id"],
+                message_id=session.search_message_id,
                 parse_mode="Markdown",
                 disable_web_page_preview=True
             )
@@ -378,12 +448,12 @@ async def handle_period_selection(message: types.Message):
             await bot.edit_message_text(
                 "😔 Не знайдено жодних квитків для вибраного періоду.",
                 chat_id=message.chat.id,
-                message_id=user_data[user_id]["search_message_id"]
+                message_id=session.search_message_id
             )
     except Exception as e:
         logging.error(f"Error during flight search: {e}")
         await bot.edit_message_text(
             "😢 Сталася помилка під час пошуку квитків. Спробуйте пізніше.",
             chat_id=message.chat.id,
-            message_id=user_data[user_id]["search_message_id"]
+            message_id=session.search_message_id
         )
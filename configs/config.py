@@ -11,8 +11,88 @@ WEBHOOK_URL = f"{WEBHOOK_HOST}{WEBHOOK_PATH}"
 WEBAPP_HOST = '0.0.0.0'
 WEBAPP_PORT = 4040
 
+# Searchable destinations (IATA code and city name), loaded once at startup
+DESTINATIONS_PATH = os.getenv('DESTINATIONS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'destinations.json'))
+
 SEARCH_PERIODS = {
     "week": 7,
     "month": 30,  # 1 month
     "three_months": 90  # 3 months
 }
+
+# Ryanair API base URL, point it at a local stub for offline benchmarks
+RYANAIR_API_URL = os.getenv('RYANAIR_API_URL', 'https://www.ryanair.com').rstrip('/')
+AVAILABILITY_URL = f"{RYANAIR_API_URL}/api/booking/v4/en-gb/availability"
+# Month fare calendar: the cheapest fare of every day of a month per route, formatted with origin and destination
+CHEAPEST_PER_DAY_URL = f"{RYANAIR_API_URL}/api/farfnd/v4/oneWayFares/{{origin}}/{{destination}}/cheapestPerDay"
+# Period searches: availability (one request per 5-day window) or calendar (one per month, plus one
+# availability request per destination for the day that is shown), used when it needs fewer requests
+UPSTREAM_BACKEND = os.getenv('UPSTREAM_BACKEND', 'availability')
+UPSTREAM_REQUEST_TIMEOUT = float(os.getenv('UPSTREAM_REQUEST_TIMEOUT', 15))  # seconds
+
+# Fare cache in front of the Ryanair availability API
+FARE_CACHE_TTL = int(os.getenv('FARE_CACHE_TTL', 15 * 60))  # seconds
+FARE_CACHE_MAX_ENTRIES = int(os.getenv('FARE_CACHE_MAX_ENTRIES', 4096))
+
+# Range-minimum fare index over the fetched days, per route
+FARE_INDEX_DAYS = int(os.getenv('FARE_INDEX_DAYS', 400))  # days ahead of yesterday
+
+# Rank period search results on a destination x day fare matrix: off (default), auto (numpy when
+# installed), numpy or python; numpy comes from requirements-numpy.txt
+FARE_MATRIX_ENGINE = os.getenv('FARE_MATRIX_ENGINE', 'off')
+
+# Persistent fare store (SQLite), an empty path disables it
+FARE_STORE_PATH = os.getenv('FARE_STORE_PATH', 'fares.sqlite3')
+FARE_STORE_MAX_AGE = int(os.getenv('FARE_STORE_MAX_AGE', 3 * 60 * 60))  # seconds
+FARE_STORE_BATCH_SIZE = int(os.getenv('FARE_STORE_BATCH_SIZE', 20))
+
+# Shared aiohttp connection pool for upstream requests
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 32))
+HTTP_POOL_PER_HOST = int(os.getenv('HTTP_POOL_PER_HOST', 8))
+HTTP_DNS_CACHE_TTL = int(os.getenv('HTTP_DNS_CACHE_TTL', 300))  # seconds
+HTTP_KEEPALIVE_TIMEOUT = int(os.getenv('HTTP_KEEPALIVE_TIMEOUT', 60))  # seconds
+
+# Adaptive (AIMD) limit on concurrent upstream requests
+UPSTREAM_CONCURRENCY_INITIAL = int(os.getenv('UPSTREAM_CONCURRENCY_INITIAL', 2))
+UPSTREAM_CONCURRENCY_MIN = int(os.getenv('UPSTREAM_CONCURRENCY_MIN', 1))
+UPSTREAM_CONCURRENCY_MAX = int(os.getenv('UPSTREAM_CONCURRENCY_MAX', 8))
+
+# Global pacing of upstream requests (token bucket), a rate <= 0 disables it
+UPSTREAM_RATE = float(os.getenv('UPSTREAM_RATE', 2.0))  # requests per second
+UPSTREAM_BURST = int(os.getenv('UPSTREAM_BURST', 4))
+UPSTREAM_RETRY_BACKOFF = float(os.getenv('UPSTREAM_RETRY_BACKOFF', 1.0))  # seconds, doubled on each retry
+
+# Background pre-warming of the fare space, a rate <= 0 disables it
+PREWARM_RATE = float(os.getenv('PREWARM_RATE', 0.2))  # requests per second
+PREWARM_REFRESH_INTERVALS = {
+    7: 10 * 60,  # up to a week ahead - every 10 minutes
+    30: 45 * 60,  # up to a month ahead - every 45 minutes
+    90: 3 * 60 * 60  # further ahead - every 3 hours
+}
+
+# Log event loop callbacks that run longer than this many seconds (asyncio debug mode), 0 disables it
+ASYNCIO_SLOW_CALLBACK = float(os.getenv('ASYNCIO_SLOW_CALLBACK', 0))
+
+# Webhook updates are acknowledged at once and processed by a pool of workers
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', 16))
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', 1000))
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv('WEBHOOK_DRAIN_TIMEOUT', 30))  # seconds to finish queued updates on shutdown
+
+# Minimum seconds between edits of a search progress message
+PROGRESS_EDIT_INTERVAL = float(os.getenv('PROGRESS_EDIT_INTERVAL', 2.0))
+
+# Calendars show the cheapest already fetched fare per day, fares older than this many seconds are left out
+CALENDAR_HEATMAP = os.getenv('CALENDAR_HEATMAP', '1') == '1'
+CALENDAR_HEATMAP_MAX_AGE = int(os.getenv('CALENDAR_HEATMAP_MAX_AGE', FARE_STORE_MAX_AGE))
+
+# Per-user search sessions
+SESSION_MAX_ENTRIES = int(os.getenv('SESSION_MAX_ENTRIES', 10000))
+SESSION_IDLE_TTL = int(os.getenv('SESSION_IDLE_TTL', 60 * 60))  # seconds
+
+# Per-search trace spans, can also be toggled at runtime with SIGUSR1; an empty path only logs a summary line
+TRACE_ENABLED = os.getenv('TRACE_ENABLED', '0') == '1'
+TRACE_PATH = os.getenv('TRACE_PATH', '')
+
+# Side port for /metrics in polling mode, 0 disables it (the webhook app serves /metrics itself)
+METRICS_HOST = os.getenv('METRICS_HOST', '0.0.0.0')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
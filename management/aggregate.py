@@ -0,0 +1,91 @@
+import heapq
+from datetime import date
+from itertools import count
+from typing import Iterable, List, Optional
+
+from management.flight import Flight
+
+
+class CheapestPerDestination:
+    """Running cheapest fares per destination over a date range
+
+    Responses are fed in as they arrive; only the best in-range fare (and,
+    with top_k > 1, a bounded heap of the k cheapest) is kept per
+    destination, so memory is O(destinations * k) however many flights the
+    searched windows return. Range checks use the pre-parsed departure.
+
+    Args:
+        first_day: earliest departure day to keep, None for no lower bound
+        last_day: latest departure day to keep, None for no upper bound
+        top_k: how many of the cheapest fares to keep per destination
+    """
+
+    def __init__(self, first_day: Optional[date] = None, last_day: Optional[date] = None, top_k: int = 1):
+        self.first_day = first_day
+        self.last_day = last_day
+        self.top_k = max(1, top_k)
+        self._best = {}  # destination -> Flight
+        self._heaps = {}  # destination -> [(-price, seq, Flight)], only for top_k > 1
+        self._seq = count()
+
+    def add(self, flights: Iterable[Flight], city: str = "") -> Optional[Flight]:
+        """Feeds one response, returns the destination's new best fare if it improved
+
+        Args:
+            flights: flights of one response, all to the same destination
+            city: destination name to attach to the kept flights
+        """
+        first_day, last_day = self.first_day, self.last_day
+        improved = None
+        for flight in flights:
+            day = flight.departure.date()
+            if (first_day is not None and day < first_day) or (last_day is not None and day > last_day):
+                continue
+            if self._offer(flight, city):
+                improved = self._best[flight.destination]
+        return improved
+
+    def offer(self, flight: Flight) -> bool:
+        """Feeds one already named flight without a range check, True if it became the best"""
+        return self._offer(flight, None)
+
+    def best(self, destination: str) -> Optional[Flight]:
+        return self._best.get(destination)
+
+    def top(self, destination: str) -> List[Flight]:
+        """Up to top_k cheapest fares of a destination, cheapest first"""
+        heap = self._heaps.get(destination)
+        if heap is None:
+            best = self._best.get(destination)
+            return [best] if best is not None else []
+        return [flight for _, _, flight in sorted(heap, reverse=True)]
+
+    def results(self) -> List[Flight]:
+        """The best fare of every destination, cheapest first"""
+        return sorted(self._best.values(), key=lambda flight: flight.price)
+
+    def __len__(self):
+        return len(self._best)
+
+    def _offer(self, flight, city):
+        destination = flight.destination
+        best = self._best.get(destination)
+        is_best = best is None or flight.price < best.price
+
+        if self.top_k > 1:
+            heap = self._heaps.setdefault(destination, [])
+            if len(heap) < self.top_k:
+                flight = self._named(flight, city)
+                heapq.heappush(heap, (-flight.price, next(self._seq), flight))
+            elif flight.price < -heap[0][0]:
+                flight = self._named(flight, city)
+                heapq.heapreplace(heap, (-flight.price, next(self._seq), flight))
+
+        if is_best:
+            self._best[destination] = self._named(flight, city)
+        return is_best
+
+    @staticmethod
+    def _named(flight, city):
+        # Only kept flights get the city attached, the rest are never copied
+        return flight._replace(city=city) if city and flight.city != city else flight
@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+
+from configs.config import FARE_CACHE_TTL, FARE_CACHE_MAX_ENTRIES
+
+
+class FareCache:
+    """In-process TTL cache for availability responses with LRU eviction
+
+    Keys are the normalized request parameters (see make_key), values are the
+    immutable Flight records returned by the API. The sync search runs in
+    worker threads, so every operation is guarded by a lock.
+    """
+
+    def __init__(self, ttl: float = FARE_CACHE_TTL, max_entries: int = FARE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, flights)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(origin, destination, date_out, flex_before=2, flex_after=2):
+        return (origin.strip().upper(), destination.strip().upper(), date_out[:10], flex_before, flex_after)
+
+    def get(self, key):
+        """Returns the cached Flight records or None on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def set(self, key, flights, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        stored = tuple(flights)
+        with self._lock:
+            self._entries[key] = (expires_at, stored)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Shared by every search path in the process
+fare_cache = FareCache()
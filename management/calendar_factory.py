@@ -1,7 +1,8 @@
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters.callback_data import CallbackData
-from typing import Union
+from typing import Dict, Optional, Union
 
 class CalendarCallbackFactory(CallbackData, prefix="calendar"):
     act: str
@@ -10,26 +11,115 @@ class CalendarCallbackFactory(CallbackData, prefix="calendar"):
     day: int
 
 class CalendarMarkup:
-    def __init__(self):
+    """Inline month calendar for picking a departure date
+
+    Built keyboards are cached per (year, month, first selectable day), so
+    opening the calendar or flipping months only looks up a ready markup.
+    Days before today are IGNORE cells and cannot be picked.
+
+    Given known fares, the calendar becomes a price heatmap: every day with
+    a fare is marked by how cheap it is within the month, and a row under
+    the days lists the cheapest ones with their fares. Day buttons are too
+    narrow for prices. Fares go stale, so heatmaps are not cached.
+    """
+
+    SUMMARY_DAYS = 3
+
+    def __init__(self, max_cached: int = 48):
         self.months = {
             1: "Січень", 2: "Лютий", 3: "Березень", 4: "Квітень",
             5: "Травень", 6: "Червень", 7: "Липень", 8: "Серпень",
             9: "Вересень", 10: "Жовтень", 11: "Листопад", 12: "Грудень"
         }
         self.days = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Нд"]
+        self.max_cached = max_cached
+        self._cache = OrderedDict()  # (year, month, first selectable day) -> InlineKeyboardMarkup
 
     def create_calendar(
         self,
-        year: int = datetime.now().year,
-        month: int = datetime.now().month
+        year: Optional[int] = None,
+        month: Optional[int] = None,
+        today: Optional[date] = None,
+        prices: Optional[Dict[date, float]] = None
     ) -> InlineKeyboardMarkup:
+        """Returns the keyboard for a month, the current month by default
+
+        Args:
+            year, month: month to show, default to today's
+            today: first selectable day, defaults to the current date
+            prices: cheapest known fare per day, turns the calendar into a heatmap
+        """
+        today = today or date.today()
+        year = year or today.year
+        month = month or today.month
+
+        # Only the current month depends on the exact day
+        if (year, month) < (today.year, today.month):
+            first_selectable = 32
+        elif (year, month) == (today.year, today.month):
+            first_selectable = today.day
+        else:
+            first_selectable = 1
+
+        no_prev = (year, month) <= (today.year, today.month)
+        month_prices = self._month_prices(year, month, first_selectable, prices) if prices else None
+        if month_prices:
+            return self._build(year, month, first_selectable, no_prev, month_prices)
+
+        key = (year, month, first_selectable)
+        markup = self._cache.get(key)
+        if markup is None:
+            markup = self._build(year, month, first_selectable, no_prev)
+            self._cache[key] = markup
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        return markup
+
+    @staticmethod
+    def _month_prices(year: int, month: int, first_selectable: int, prices: Dict[date, float]) -> Dict[int, float]:
+        """Fares of the selectable days of the month, by day number"""
+        return {
+            day.day: price for day, price in prices.items()
+            if day.year == year and day.month == month and day.day >= first_selectable
+        }
+
+    @staticmethod
+    def _price_labels(month_prices: Dict[int, float]) -> Dict[int, str]:
+        """Button texts for the days that have a fare: a marker and the day number
+
+        The cheapest day(s) get 🔥, the rest 🟢/🟡/🔴 by the price tercile within the month.
+        """
+        ordered = sorted(month_prices.values())
+        cheapest = ordered[0]
+        low = ordered[(len(ordered) - 1) // 3]
+        high = ordered[2 * (len(ordered) - 1) // 3]
+
+        labels = {}
+        for day, price in month_prices.items():
+            if price == cheapest:
+                marker = "🔥"
+            elif price <= low:
+                marker = "🟢"
+            elif price <= high:
+                marker = "🟡"
+            else:
+                marker = "🔴"
+            labels[day] = f"{marker}{day}"
+        return labels
+
+    def _build(self, year: int, month: int, first_selectable: int, no_prev: bool,
+               month_prices: Optional[Dict[int, float]] = None) -> InlineKeyboardMarkup:
         keyboard = []
+        labels = self._price_labels(month_prices) if month_prices else None
+        ignore = CalendarCallbackFactory(act="IGNORE", year=year, month=month, day=1).pack()
 
-        # Додаємо рядок з місяцем і роком
+        # Додаємо рядок з місяцем і роком, назад у минуле гортати нема куди
         keyboard.append([
             InlineKeyboardButton(
-                text="<<",
-                callback_data=CalendarCallbackFactory(
+                text=" " if no_prev else "<<",
+                callback_data=ignore if no_prev else CalendarCallbackFactory(
                     act="PREV-MONTH",
                     year=year,
                     month=month,
@@ -38,12 +128,7 @@ class CalendarMarkup:
             ),
             InlineKeyboardButton(
                 text=f'{self.months[month]} {str(year)}',
-                callback_data=CalendarCallbackFactory(
-                    act="IGNORE",
-                    year=year,
-                    month=month,
-                    day=1
-                ).pack()
+                callback_data=ignore
             ),
             InlineKeyboardButton(
                 text=">>",
@@ -58,12 +143,7 @@ class CalendarMarkup:
 
         # Додаємо дні тижня
         keyboard.append(
-            [InlineKeyboardButton(text=day, callback_data=CalendarCallbackFactory(
-                act="IGNORE",
-                year=year,
-                month=month,
-                day=1
-            ).pack()) for day in self.days]
+            [InlineKeyboardButton(text=day, callback_data=ignore) for day in self.days]
         )
 
         month_calendar = self._get_month_calendar(year, month)
@@ -72,18 +152,13 @@ class CalendarMarkup:
             calendar_row = []
             for day in week:
                 if day == 0:
-                    calendar_row.append(InlineKeyboardButton(
-                        text=" ",
-                        callback_data=CalendarCallbackFactory(
-                            act="IGNORE",
-                            year=year,
-                            month=month,
-                            day=day
-                        ).pack()
-                    ))
+                    calendar_row.append(InlineKeyboardButton(text=" ", callback_data=ignore))
+                elif day < first_selectable:
+                    # Минулі дні не можна вибрати
+                    calendar_row.append(InlineKeyboardButton(text="·", callback_data=ignore))
                 else:
                     calendar_row.append(InlineKeyboardButton(
-                        text=str(day),
+                        text=labels.get(day, str(day)) if labels else str(day),
                         callback_data=CalendarCallbackFactory(
                             act="DAY",
                             year=year,
@@ -93,6 +168,20 @@ class CalendarMarkup:
                     ))
             keyboard.append(calendar_row)
 
+        if labels:
+            # Найдешевші дні з цінами, кнопки ведуть одразу до пошуку на цю дату
+            cheapest = sorted(month_prices.items(), key=lambda item: (item[1], item[0]))[:self.SUMMARY_DAYS]
+            keyboard.append([
+                InlineKeyboardButton(
+                    text=f"{labels[day]}.{month:02d} · {price:.0f}€",
+                    callback_data=CalendarCallbackFactory(act="DAY", year=year, month=month, day=day).pack()
+                )
+                for day, price in cheapest
+            ])
+            # Легенда теплової карти
+            keyboard.append([InlineKeyboardButton(text="🔥 мінімум · 🟢 дешево · 🟡 середньо · 🔴 дорого",
+                                                  callback_data=ignore)])
+
         return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
     def _get_month_calendar(self, year: int, month: int) -> list:
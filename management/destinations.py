@@ -0,0 +1,56 @@
+import json
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+
+from configs.config import DESTINATIONS_PATH
+
+
+class Destination(NamedTuple):
+    code: str  # IATA code of the airport
+    city: str  # name shown to users
+
+
+class DestinationRegistry:
+    """Searchable destinations, loaded once from configs/destinations.json
+
+    Keeps the configured order for keyboards and searches, plus dict indexes
+    for O(1) lookups by IATA code and by (case-insensitive) city name.
+    """
+
+    def __init__(self, destinations, origin: str = "BER"):
+        self.origin = origin
+        self._all: Tuple[Destination, ...] = tuple(destinations)
+        self._by_code: Dict[str, Destination] = {dest.code.upper(): dest for dest in self._all}
+        self._by_city: Dict[str, Destination] = {dest.city.casefold(): dest for dest in self._all}
+        if len(self._by_code) != len(self._all):
+            raise ValueError("Duplicate destination codes in the destination list")
+
+    @classmethod
+    def load(cls, path: str = DESTINATIONS_PATH) -> "DestinationRegistry":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            (Destination(item["code"].strip().upper(), item["city"].strip()) for item in data["destinations"]),
+            origin=data.get("origin", "BER"),
+        )
+
+    def all(self) -> Tuple[Destination, ...]:
+        return self._all
+
+    def by_code(self, code: str) -> Optional[Destination]:
+        return self._by_code.get(code.strip().upper())
+
+    def by_city(self, city: str) -> Optional[Destination]:
+        return self._by_city.get(city.strip().casefold())
+
+    def __iter__(self) -> Iterator[Destination]:
+        return iter(self._all)
+
+    def __len__(self):
+        return len(self._all)
+
+    def __contains__(self, code):
+        return isinstance(code, str) and code.strip().upper() in self._by_code
+
+
+# Loaded once at import
+destination_registry = DestinationRegistry.load()
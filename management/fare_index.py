@@ -0,0 +1,238 @@
+import heapq
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from configs.config import FARE_CACHE_TTL, FARE_INDEX_DAYS
+from management.flight import Flight
+
+INF = float("inf")
+
+
+class MinSegmentTree:
+    """Point-update, range-min segment tree that also returns where the minimum is"""
+
+    def __init__(self, size: int, fill: float = INF):
+        n = 1
+        while n < size:
+            n *= 2
+        self.n = n
+        self.values = [fill] * (2 * n)
+        self.positions = [0] * n + list(range(n))
+
+    def update(self, position: int, value: float):
+        i = position + self.n
+        values, positions = self.values, self.positions
+        values[i] = value
+        i //= 2
+        while i:
+            left, right = 2 * i, 2 * i + 1
+            child = left if values[left] <= values[right] else right
+            values[i] = values[child]
+            positions[i] = positions[child]
+            i //= 2
+
+    def query(self, first: int, last: int):
+        """Returns (minimum, position) over positions first..last inclusive"""
+        values, positions = self.values, self.positions
+        best, where = INF, -1
+        lo, hi = first + self.n, last + self.n + 1
+        while lo < hi:
+            if lo & 1:
+                if values[lo] < best:
+                    best, where = values[lo], positions[lo]
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                if values[hi] < best:
+                    best, where = values[hi], positions[hi]
+            lo //= 2
+            hi //= 2
+        return best, where
+
+    def get(self, position: int) -> float:
+        return self.values[position + self.n]
+
+
+class _RouteFares:
+    """Day-indexed best fares of one route, days counted from base (a date ordinal)"""
+
+    def __init__(self, base: int, days: int):
+        self.base = base
+        self.days = days
+        self.flights: List[Optional[Flight]] = [None] * days
+        self.prices = MinSegmentTree(days)
+        self.fetched_at = [0.0] * days
+        # Minimum expiry over a range tells whether every day in it is fresh; unknown days count as expired
+        self.fresh_until = MinSegmentTree(days, fill=0.0)
+
+    def set_day(self, position: int, flight: Optional[Flight], fetched_at: float, fresh_until: float):
+        self.flights[position] = flight
+        self.prices.update(position, flight.price if flight is not None else INF)
+        self.fetched_at[position] = fetched_at
+        self.fresh_until.update(position, fresh_until)
+
+    def rebased(self, base: int) -> "_RouteFares":
+        moved = _RouteFares(base, self.days)
+        for position, flight in enumerate(self.flights):
+            new_position = position + self.base - base
+            fetched_at = self.fetched_at[position]
+            if 0 <= new_position < self.days and fetched_at:
+                moved.set_day(new_position, flight, fetched_at, self.fresh_until.get(position))
+        return moved
+
+
+class FareIndex:
+    """In-memory range-minimum index of the cheapest fare per route and day
+
+    Every parsed availability response is fed in as a window: each of its days
+    gets the cheapest flight of that day (or none) and the fetch time. On top
+    of the per-day array two segment trees answer, in O(log n), the cheapest
+    fare in any date range and whether every day of a range is still fresh.
+    Searches use that to answer covered routes without going through the
+    per-window cache.
+
+    Args:
+        days: how many days ahead of yesterday are indexed per route
+        max_age: seconds a fetched day counts as fresh, unless its window was added with its own
+    """
+
+    def __init__(self, days: int = FARE_INDEX_DAYS, max_age: float = FARE_CACHE_TTL):
+        self.days = days
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._routes = {}  # (origin, destination) -> _RouteFares
+        self._lock = threading.Lock()
+
+    def add_window(self, origin: str, destination: str, date_out: str, flex_before: int, flex_after: int,
+                   flights: Iterable[Flight], fetched_at: float = None, max_age: float = None):
+        """Replaces the days covered by one availability response with its flights
+
+        Args:
+            max_age: seconds the window counts as fresh, the index's max_age by default
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        fresh_until = fetched_at + (self.max_age if max_age is None else max_age)
+        anchor = date.fromisoformat(date_out[:10])
+        first_day = anchor - timedelta(days=flex_before)
+
+        per_day = [None] * (flex_before + flex_after + 1)
+        for flight in flights:
+            offset = (flight.departure.date() - first_day).days
+            if 0 <= offset < len(per_day) and (per_day[offset] is None or flight.price < per_day[offset].price):
+                per_day[offset] = flight
+
+        with self._lock:
+            route = self._route(origin, destination, first_day + timedelta(days=len(per_day) - 1), create=True)
+            if route is None:
+                return
+            start = first_day.toordinal() - route.base
+            for offset, flight in enumerate(per_day):
+                position = start + offset
+                if 0 <= position < route.days:
+                    route.set_day(position, flight, fetched_at, fresh_until)
+
+    def covers(self, origin: str, destination: str, first_day: date, last_day: date, now: float = None) -> bool:
+        """True if every day of the range is still fresh"""
+        now = time.time() if now is None else now
+        with self._lock:
+            route = self._routes.get((origin, destination))
+            positions = self._positions(route, first_day, last_day)
+            covered = positions is not None and route.fresh_until.query(*positions)[0] >= now
+        if covered:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return covered
+
+    def cheapest(self, origin: str, destination: str, first_day: date, last_day: date) -> Optional[Flight]:
+        """Cheapest known fare of a route departing between first_day and last_day inclusive"""
+        with self._lock:
+            route = self._routes.get((origin, destination))
+            positions = self._positions(route, first_day, last_day)
+            if positions is None:
+                return None
+            price, position = route.prices.query(*positions)
+            return route.flights[position] if price < INF else None
+
+    def cheapest_around(self, origin: str, destination: str, day: date, days: int) -> Optional[Flight]:
+        """Cheapest known fare of a route within +/- days of a day"""
+        return self.cheapest(origin, destination, day - timedelta(days=days), day + timedelta(days=days))
+
+    def top_destinations(self, origin: str, first_day: date, last_day: date, k: int) -> List[Flight]:
+        """The k destinations with the cheapest fares in the range, cheapest first"""
+        candidates = []
+        for route_origin, destination in list(self._routes):
+            if route_origin == origin:
+                flight = self.cheapest(origin, destination, first_day, last_day)
+                if flight is not None:
+                    candidates.append(flight)
+        return heapq.nsmallest(k, candidates, key=lambda flight: flight.price)
+
+    def day_prices(self, origin: str, destination: Optional[str], first_day: date, last_day: date,
+                   max_age: float = None, now: float = None) -> Dict[date, float]:
+        """Cheapest known fare per day of a range, of one destination or (None) of all of them
+
+        Only reads what was already fetched, days without a fare fetched
+        within max_age (default: the index's) are left out.
+        """
+        max_age = self.max_age if max_age is None else max_age
+        deadline = (time.time() if now is None else now) - max_age
+        prices = {}
+        with self._lock:
+            if destination is not None:
+                routes = [self._routes.get((origin, destination))]
+            else:
+                routes = [route for (route_origin, _), route in self._routes.items() if route_origin == origin]
+            for route in routes:
+                if route is None:
+                    continue
+                first = max(0, first_day.toordinal() - route.base)
+                last = min(route.days - 1, last_day.toordinal() - route.base)
+                for position in range(first, last + 1):
+                    flight = route.flights[position]
+                    if flight is None or route.fetched_at[position] < deadline:
+                        continue
+                    day = date.fromordinal(route.base + position)
+                    if day not in prices or flight.price < prices[day]:
+                        prices[day] = flight.price
+        return prices
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+    def stats(self):
+        return {"routes": len(self._routes), "days": self.days, "hits": self.hits, "misses": self.misses}
+
+    def _route(self, origin, destination, last_day, create=False):
+        key = (origin, destination)
+        route = self._routes.get(key)
+        base = date.today().toordinal() - 1
+        if route is None:
+            if not create:
+                return None
+            route = self._routes[key] = _RouteFares(base, self.days)
+        elif last_day.toordinal() >= route.base + route.days and base > route.base:
+            # Days have moved on since the route was indexed, drop the past to make room
+            route = self._routes[key] = route.rebased(base)
+        return route
+
+    @staticmethod
+    def _positions(route, first_day, last_day):
+        if route is None:
+            return None
+        first = first_day.toordinal() - route.base
+        last = last_day.toordinal() - route.base
+        if first < 0 or last >= route.days or first > last:
+            return None
+        return first, last
+
+
+# Shared by every search path in the process
+fare_index = FareIndex()
+
+# Month fare calendar prices, unconfirmed by availability; only the calendar period search reads them
+calendar_index = FareIndex()
@@ -0,0 +1,256 @@
+import heapq
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from configs.config import FARE_MATRIX_ENGINE
+from management.aggregate import CheapestPerDestination
+from management.destinations import Destination
+from management.flight import Flight
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, PythonFareMatrix answers the same queries with plain lists
+    np = None
+
+
+class _FareMatrixBase:
+    """Destinations x days grid of the cheapest fare per cell
+
+    Period searches rank on it with FARE_MATRIX_ENGINE set, see
+    create_fare_ranking; benchmarks/bench_ranking.py measures both engines.
+
+    Rows follow the given destination order, column 0 is first_day. Every
+    cell keeps the cheapest fare of that destination and day plus its
+    departure time, in minutes since first_day. Windows are inclusive date
+    ranges clipped to the grid, None means the grid edge.
+
+    Args:
+        destinations: row order of the grid
+        first_day: day of column 0
+        days: number of columns
+        origin: departure airport of all fares
+    """
+
+    engine = None
+
+    def __init__(self, destinations: Sequence[Destination], first_day: date, days: int, origin: str = "BER"):
+        self.destinations = tuple(destinations)
+        self.first_day = first_day
+        self.days = days
+        self.origin = origin
+        self._rows = {dest.code: row for row, dest in enumerate(self.destinations)}
+        self._midnight = datetime.combine(first_day, datetime.min.time())
+
+    def _columns(self, first_day, last_day):
+        first = 0 if first_day is None else max(0, (first_day - self.first_day).days)
+        last = self.days - 1 if last_day is None else min(self.days - 1, (last_day - self.first_day).days)
+        return first, last + 1
+
+    def _cells(self, flights):
+        """(row, column, price, minutes) of the flights that fall into the grid"""
+        rows, days, base = self._rows, self.days, self.first_day.toordinal()
+        for flight in flights:
+            row = rows.get(flight.destination)
+            if row is None:
+                continue
+            departure = flight.departure
+            column = departure.toordinal() - base
+            if 0 <= column < days:
+                yield row, column, flight.price, column * 1440 + departure.hour * 60 + departure.minute
+
+    def _flight(self, row, price, minutes):
+        dest = self.destinations[row]
+        return Flight(self.origin, dest.code, self._midnight + timedelta(minutes=int(minutes)),
+                      round(float(price), 2), dest.city)
+
+
+class NumpyFareMatrix(_FareMatrixBase):
+    """Fare grid as a float32 price matrix (NaN for no flight) and an int32 departure matrix
+
+    Per-destination minimums, top-k and percentiles are single reductions over
+    a column slice, so a query costs the same few NumPy calls for 20 or 2000
+    destinations.
+    """
+
+    engine = "numpy"
+
+    def __init__(self, destinations: Sequence[Destination], first_day: date, days: int, origin: str = "BER"):
+        super().__init__(destinations, first_day, days, origin)
+        self.prices = np.full((len(self.destinations), days), np.nan, dtype=np.float32)
+        self.departures = np.zeros((len(self.destinations), days), dtype=np.int32)
+        self._pending = []
+
+    def add(self, flights: Iterable[Flight]):
+        # Buffered and merged in one vectorized pass before the next query, per-response arrays cost more than they save
+        self._pending.extend(self._cells(flights))
+
+    def _flush(self):
+        if not self._pending:
+            return
+        rows, columns, prices, minutes = (np.array(values) for values in zip(*self._pending))
+        self._pending = []
+        positions = rows * self.days + columns
+        prices = prices.astype(np.float32)
+
+        # Cheapest fare per cell within the batch: sort by cell, then price, keep the first of each cell
+        order = np.lexsort((prices, positions))
+        positions, prices, minutes = positions[order], prices[order], minutes[order]
+        first = np.ones(len(positions), dtype=bool)
+        first[1:] = positions[1:] != positions[:-1]
+        positions, prices, minutes = positions[first], prices[first], minutes[first]
+
+        flat_prices = self.prices.reshape(-1)
+        current = flat_prices[positions]
+        better = np.isnan(current) | (prices < current)
+        flat_prices[positions[better]] = prices[better]
+        self.departures.reshape(-1)[positions[better]] = minutes[better]
+
+    def _row_minimums(self, first_day, last_day):
+        """(rows with a fare, their minimum price, its column) for a window"""
+        self._flush()
+        first, stop = self._columns(first_day, last_day)
+        window = self.prices[:, first:stop]
+        if window.shape[1] == 0:
+            empty = np.empty(0, dtype=np.intp)
+            return empty, np.empty(0, dtype=np.float32), empty
+        filled = np.where(np.isnan(window), np.inf, window)
+        columns = filled.argmin(axis=1)
+        minimums = filled[np.arange(len(filled)), columns]
+        rows = np.flatnonzero(np.isfinite(minimums))
+        return rows, minimums[rows], columns[rows] + first
+
+    def _flights(self, rows, minimums, columns):
+        departures = self.departures[rows, columns]
+        return [self._flight(row, price, minutes)
+                for row, price, minutes in zip(rows.tolist(), minimums.tolist(), departures.tolist())]
+
+    def cheapest(self, first_day: Optional[date] = None, last_day: Optional[date] = None) -> List[Flight]:
+        """Cheapest fare of every destination in the window, cheapest first"""
+        rows, minimums, columns = self._row_minimums(first_day, last_day)
+        order = np.argsort(minimums, kind="stable")
+        return self._flights(rows[order], minimums[order], columns[order])
+
+    def top(self, k: int, first_day: Optional[date] = None, last_day: Optional[date] = None) -> List[Flight]:
+        """The k destinations with the cheapest fares in the window, cheapest first"""
+        rows, minimums, columns = self._row_minimums(first_day, last_day)
+        if k < len(minimums):
+            # Only the k winners get sorted
+            selected = np.argpartition(minimums, k - 1)[:k]
+            rows, minimums, columns = rows[selected], minimums[selected], columns[selected]
+        order = np.argsort(minimums, kind="stable")[:k]
+        return self._flights(rows[order], minimums[order], columns[order])
+
+    def percentiles(self, qs: Sequence[float] = (10, 50, 90), first_day: Optional[date] = None,
+                    last_day: Optional[date] = None) -> Dict[float, float]:
+        """Percentiles of the per-day cheapest fares of all destinations in the window, {} if there are none"""
+        self._flush()
+        first, stop = self._columns(first_day, last_day)
+        window = self.prices[:, first:stop]
+        values = window[~np.isnan(window)].astype(np.float64)
+        if not len(values):
+            return {}
+        return {q: round(float(value), 2) for q, value in zip(qs, np.percentile(values, qs))}
+
+
+class PythonFareMatrix(_FareMatrixBase):
+    """The same grid as lists of rows, for installs without NumPy"""
+
+    engine = "python"
+
+    def __init__(self, destinations: Sequence[Destination], first_day: date, days: int, origin: str = "BER"):
+        super().__init__(destinations, first_day, days, origin)
+        self.prices = [[None] * days for _ in self.destinations]
+        self.departures = [[0] * days for _ in self.destinations]
+
+    def add(self, flights: Iterable[Flight]):
+        prices, departures = self.prices, self.departures
+        for row, column, price, minutes in self._cells(flights):
+            current = prices[row][column]
+            if current is None or price < current:
+                prices[row][column] = price
+                departures[row][column] = minutes
+
+    def _row_minimums(self, first_day, last_day):
+        first, stop = self._columns(first_day, last_day)
+        for row, row_prices in enumerate(self.prices):
+            best, best_column = None, None
+            for column in range(first, stop):
+                price = row_prices[column]
+                if price is not None and (best is None or price < best):
+                    best, best_column = price, column
+            if best is not None:
+                yield best, row, best_column
+
+    def _flights(self, minimums):
+        return [self._flight(row, price, self.departures[row][column]) for price, row, column in minimums]
+
+    def cheapest(self, first_day: Optional[date] = None, last_day: Optional[date] = None) -> List[Flight]:
+        return self._flights(sorted(self._row_minimums(first_day, last_day)))
+
+    def top(self, k: int, first_day: Optional[date] = None, last_day: Optional[date] = None) -> List[Flight]:
+        return self._flights(heapq.nsmallest(k, self._row_minimums(first_day, last_day)))
+
+    def percentiles(self, qs: Sequence[float] = (10, 50, 90), first_day: Optional[date] = None,
+                    last_day: Optional[date] = None) -> Dict[float, float]:
+        first, stop = self._columns(first_day, last_day)
+        values = sorted(price for row_prices in self.prices for price in row_prices[first:stop] if price is not None)
+        if not values:
+            return {}
+        return {q: round(_percentile(values, q), 2) for q in qs}
+
+
+def _percentile(ordered, q):
+    """Linear interpolation between closest ranks, as numpy.percentile does by default"""
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+
+class FareMatrixRanking(CheapestPerDestination):
+    """CheapestPerDestination that also fills a fare matrix and ranks the results on it
+
+    Streaming works as in the parent: add() and offer() report a new best
+    fare per destination as responses arrive. Every fare is also put into
+    the matrix, and results() takes the destination order from the matrix's
+    per-row minimums over the period, returning the kept flights themselves.
+    """
+
+    def __init__(self, matrix: _FareMatrixBase, first_day: Optional[date] = None, last_day: Optional[date] = None):
+        super().__init__(first_day, last_day)
+        self.matrix = matrix
+
+    def add(self, flights: Iterable[Flight], city: str = "") -> Optional[Flight]:
+        flights = list(flights)
+        self.matrix.add(flights)
+        return super().add(flights, city)
+
+    def offer(self, flight: Flight) -> bool:
+        self.matrix.add((flight,))
+        return super().offer(flight)
+
+    def results(self) -> List[Flight]:
+        ranked = [self._best[flight.destination] for flight in self.matrix.cheapest(self.first_day, self.last_day)
+                  if flight.destination in self._best]
+        if len(ranked) != len(self._best):
+            # Fares outside the grid (unknown destination or day) only the plain ranking has
+            return super().results()
+        return ranked
+
+
+def create_fare_ranking(destinations: Sequence[Destination], first_day: date, last_day: date,
+                        origin: str = "BER", engine: str = FARE_MATRIX_ENGINE) -> CheapestPerDestination:
+    """Per-destination ranking of a period search, on a fare matrix of the configured engine
+
+    Args:
+        engine: "off" for the plain CheapestPerDestination, "numpy", "python"
+            or "auto" (numpy when installed)
+    """
+    if engine == "off":
+        return CheapestPerDestination(first_day, last_day)
+    if engine == "numpy" and np is None:
+        raise RuntimeError("FARE_MATRIX_ENGINE=numpy, but numpy is not installed")
+    matrix_class = PythonFareMatrix if engine == "python" or np is None else NumpyFareMatrix
+    matrix = matrix_class(destinations, first_day, (last_day - first_day).days + 1, origin)
+    return FareMatrixRanking(matrix, first_day, last_day)
@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from configs.config import FARE_STORE_PATH, FARE_STORE_MAX_AGE, FARE_STORE_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS flights (
+    origin TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    departure TEXT NOT NULL,
+    departure_date TEXT NOT NULL,
+    price REAL NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (origin, destination, departure)
+);
+CREATE INDEX IF NOT EXISTS idx_flights_destination_date ON flights (destination, departure_date);
+CREATE TABLE IF NOT EXISTS fetches (
+    origin TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    date_out TEXT NOT NULL,
+    flex_before INTEGER NOT NULL,
+    flex_after INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (origin, destination, date_out, flex_before, flex_after)
+);
+"""
+
+
+def window_bounds(date_out, flex_before, flex_after):
+    """Returns the first and last departure date covered by one availability request"""
+    anchor = datetime.strptime(date_out[:10], "%Y-%m-%d")
+    return ((anchor - timedelta(days=flex_before)).strftime("%Y-%m-%d"),
+            (anchor + timedelta(days=flex_after)).strftime("%Y-%m-%d"))
+
+
+class FareStore:
+    """SQLite-backed store of parsed flight rows that survives restarts
+
+    Every availability response is written as a "window": a row in `fetches`
+    that remembers when (origin, destination, DateOut, flex) was requested, and
+    the flights it returned. Writes are buffered and flushed in batches. Rows
+    older than max_age are treated as missing, so callers go upstream again.
+
+    Reads never flush: queued windows are answered from memory, the rest from
+    committed rows. SQLite calls block, so on the event loop use
+    asyncio.to_thread for reads; a full batch queued from the loop is written
+    in a worker thread.
+    """
+
+    def __init__(self, path: str = FARE_STORE_PATH, max_age: float = FARE_STORE_MAX_AGE,
+                 batch_size: int = FARE_STORE_BATCH_SIZE):
+        self.path = path
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self._conn = None
+        # (origin, destination, date_out, flex_before, flex_after) -> (fetched_at, flights), queued and being written
+        self._pending = {}
+        self._flushing = {}
+        self._pending_lock = threading.Lock()
+        self._lock = threading.Lock()  # guards the connection
+        self._flush_tasks = set()
+        self.flushes = 0
+
+    @property
+    def is_open(self):
+        return self._conn is not None
+
+    def open(self):
+        if self._conn is not None or not self.path:
+            return
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        logger.info(f"Fare store opened at {self.path}")
+
+    def close(self):
+        if self._conn is None:
+            return
+        self.flush()
+        with self._lock:
+            self._conn.close()
+            self._conn = None
+
+    def add_window(self, origin, destination, date_out, flex_before, flex_after, flights):
+        """Queues the result of one availability request for writing
+
+        Args:
+            flights: iterable of (departure, price) pairs
+        """
+        if self._conn is None:
+            return
+        with self._pending_lock:
+            self._pending[(origin, destination, date_out[:10], flex_before, flex_after)] = (time.time(), list(flights))
+            should_flush = len(self._pending) >= self.batch_size
+        if not should_flush:
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # A worker thread of the sync path, it can afford to write itself
+            self.flush()
+            return
+        task = loop.create_task(asyncio.to_thread(self.flush))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task):
+        self._flush_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            # flush has already put the batch back, the next full batch or close retries it
+            logger.error(f"Fare store flush failed: {task.exception()!r}")
+
+    def flush(self):
+        """Writes the queued windows in one transaction, blocking; call it off the event loop"""
+        with self._lock:
+            with self._pending_lock:
+                if self._conn is None or not self._pending:
+                    return
+                pending, self._pending = self._pending, {}
+                self._flushing = pending
+            try:
+                self._write(pending)
+            except Exception:
+                with self._pending_lock:
+                    # Re-queued behind anything newer queued for the same windows meanwhile
+                    self._pending = {**pending, **self._pending}
+                raise
+            finally:
+                with self._pending_lock:
+                    self._flushing = {}
+            self.flushes += 1
+        logger.debug(f"Fare store flushed {len(pending)} windows")
+
+    def _write(self, pending):
+        with self._conn:
+            for (origin, destination, date_out, flex_before, flex_after), (fetched_at, flights) in pending.items():
+                first_day, last_day = window_bounds(date_out, flex_before, flex_after)
+                # The new response is authoritative for its window: drop flights that disappeared
+                self._conn.execute(
+                    "DELETE FROM flights WHERE origin = ? AND destination = ? "
+                    "AND departure_date BETWEEN ? AND ?",
+                    (origin, destination, first_day, last_day)
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO flights VALUES (?, ?, ?, ?, ?, ?)",
+                    [(origin, destination, departure, departure[:10], price, fetched_at)
+                     for departure, price in flights]
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO fetches VALUES (?, ?, ?, ?, ?, ?)",
+                    (origin, destination, date_out, flex_before, flex_after, fetched_at)
+                )
+
+    def get_window(self, origin, destination, date_out, flex_before=2, flex_after=2):
+        """Returns (fetched_at, [(departure, price), ...]) for a fresh window or None, blocking"""
+        if self._conn is None:
+            return None
+        cutoff = time.time() - self.max_age
+        key = (origin, destination, date_out[:10], flex_before, flex_after)
+        with self._pending_lock:
+            queued = self._pending.get(key) or self._flushing.get(key)
+        if queued is not None:
+            return queued if queued[0] >= cutoff else None
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fetched_at FROM fetches WHERE origin = ? AND destination = ? AND date_out = ? "
+                "AND flex_before = ? AND flex_after = ?",
+                (origin, destination, date_out[:10], flex_before, flex_after)
+            ).fetchone()
+            if row is None or row[0] < cutoff:
+                return None
+            return row[0], self._window_flights(origin, destination, date_out, flex_before, flex_after, cutoff)
+
+    def fresh_windows(self):
+        """Yields every fresh window as (origin, destination, date_out, flex_before, flex_after, fetched_at, flights)
+
+        Only committed windows, meant for the warm start before anything is queued. Blocking.
+        """
+        if self._conn is None:
+            return
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            windows = self._conn.execute(
+                "SELECT origin, destination, date_out, flex_before, flex_after, fetched_at "
+                "FROM fetches WHERE fetched_at >= ?",
+                (cutoff,)
+            ).fetchall()
+            result = [window + (self._window_flights(*window[:5], cutoff),) for window in windows]
+        yield from result
+
+    def prune(self):
+        """Deletes stale rows and windows, returns the number of flight rows removed"""
+        if self._conn is None:
+            return 0
+        cutoff = time.time() - self.max_age
+        with self._lock, self._conn:
+            removed = self._conn.execute("DELETE FROM flights WHERE fetched_at < ?", (cutoff,)).rowcount
+            self._conn.execute("DELETE FROM fetches WHERE fetched_at < ?", (cutoff,))
+        return removed
+
+    def _window_flights(self, origin, destination, date_out, flex_before, flex_after, cutoff):
+        first_day, last_day = window_bounds(date_out, flex_before, flex_after)
+        return self._conn.execute(
+            "SELECT departure, price FROM flights WHERE destination = ? AND departure_date BETWEEN ? AND ? "
+            "AND origin = ? AND fetched_at >= ? ORDER BY departure",
+            (destination, first_day, last_day, origin, cutoff)
+        ).fetchall()
+
+
+# Shared by every search path in the process, opened at startup
+fare_store = FareStore()
@@ -0,0 +1,41 @@
+from datetime import date, datetime
+from typing import NamedTuple
+
+
+def get_flight_link(origin, destination, date):
+    """Generates a direct link to a Ryanair flight
+
+    Args:
+        origin: IATA code of the departure airport (e.g. "BER")
+        destination: IATA code of the destination airport (e.g. "BCN")
+        date: departure date, can be in 'YYYY-MM-DD' format or with time 'YYYY-MM-DDThh:mm:ss'
+    """
+    # Make sure we have the correct date format
+    if 'T' in date:
+        formatted_date = date.split('T')[0]
+    else:
+        formatted_date = date
+
+    return f"https://www.ryanair.com/ua/uk/trip/flights/select?adults=1&teens=0&children=0&infants=0&dateOut={formatted_date}&dateIn=&isConnectedFlight=false&isReturn=false&discount=0&promoCode=&originIata={origin}&destinationIata={destination}&tpAdults=1&tpTeens=0&tpChildren=0&tpInfants=0&tpStartDate={formatted_date}&tpEndDate=&tpDiscount=0&tpPromoCode=&tpOriginIata={origin}&tpDestinationIata={destination}"
+
+
+class Flight(NamedTuple):
+    """One one-way fare with the departure already parsed
+
+    Immutable, so cached results can be shared between searches; use
+    flight._replace(city=...) to attach the destination name. The booking
+    link is built only for the flights that are actually shown.
+    """
+    origin: str
+    destination: str
+    departure: datetime
+    price: float
+    city: str = ""
+
+    @property
+    def day(self) -> date:
+        return self.departure.date()
+
+    @property
+    def link(self) -> str:
+        return get_flight_link(self.origin, self.destination, self.departure.strftime("%Y-%m-%d"))
@@ -0,0 +1,45 @@
+import logging
+from typing import Optional
+
+import aiohttp
+
+from configs.config import HTTP_POOL_SIZE, HTTP_POOL_PER_HOST, HTTP_DNS_CACHE_TTL, HTTP_KEEPALIVE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def _create_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_POOL_SIZE,
+        limit_per_host=HTTP_POOL_PER_HOST,
+        ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+
+async def start_http_session() -> aiohttp.ClientSession:
+    """Creates the process-wide session, called from the app startup hooks"""
+    global _session
+    if _session is None or _session.closed:
+        _session = _create_session()
+        logger.info(f"HTTP session started (pool {HTTP_POOL_SIZE}, {HTTP_POOL_PER_HOST} per host)")
+    return _session
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Returns the shared session, creating it lazily outside the app lifecycle (scripts, benchmarks)"""
+    global _session
+    if _session is None or _session.closed:
+        _session = _create_session()
+    return _session
+
+
+async def close_http_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logger.info("HTTP session closed")
+    _session = None
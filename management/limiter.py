@@ -0,0 +1,199 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+from configs.config import (
+    UPSTREAM_CONCURRENCY_INITIAL,
+    UPSTREAM_CONCURRENCY_MIN,
+    UPSTREAM_CONCURRENCY_MAX,
+    UPSTREAM_RATE,
+    UPSTREAM_BURST,
+)
+
+logger = logging.getLogger(__name__)
+
+# Identifies who an upstream request is made for (a search, a single lookup, a background job).
+# The rate limiter serves waiting callers round-robin so one long sweep cannot starve the others.
+upstream_caller = contextvars.ContextVar("upstream_caller", default=None)
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD limit on the number of upstream requests in flight
+
+    Every successful response grows the limit by roughly one slot per "round"
+    of requests (additive increase), a 409 or a timeout halves it
+    (multiplicative decrease). Decreases are applied at most once per
+    cooldown, so a burst of failures from one round counts as one signal.
+
+    Use as `async with limiter: ...` around a single request.
+    """
+
+    def __init__(self, initial: int = UPSTREAM_CONCURRENCY_INITIAL, minimum: int = UPSTREAM_CONCURRENCY_MIN,
+                 maximum: int = UPSTREAM_CONCURRENCY_MAX, decrease_factor: float = 0.5,
+                 decrease_cooldown: float = 2.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.in_flight = 0
+        self.successes = 0
+        self.overloads = 0
+        self._limit = float(min(max(initial, minimum), maximum))
+        self._last_decrease = 0.0
+        self._waiters = deque()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    async def acquire(self):
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before cancellation, pass it on
+                self.release()
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def on_success(self):
+        self.successes += 1
+        if self._limit < self.maximum:
+            self._limit = min(self.maximum, self._limit + 1 / self._limit)
+            self._wake()
+
+    def on_overload(self):
+        self.overloads += 1
+        now = time.monotonic()
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+        self._last_decrease = now
+        previous = self.limit
+        self._limit = max(self.minimum, self._limit * self.decrease_factor)
+        if self.limit != previous:
+            logger.info(f"Upstream overloaded, concurrency limit {previous} -> {self.limit}")
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "successes": self.successes,
+            "overloads": self.overloads,
+        }
+
+    def _wake(self):
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class TokenBucket:
+    """Process-wide token bucket pacing every upstream request
+
+    Tokens refill at `rate` per second up to `burst`. Async callers that have
+    to wait are queued per caller (see upstream_caller) and served
+    round-robin; sync callers in worker threads sleep until a token is free.
+    A rate <= 0 disables pacing.
+    """
+
+    def __init__(self, rate: float = UPSTREAM_RATE, burst: int = UPSTREAM_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.granted = 0
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._queues = OrderedDict()  # caller -> deque of waiting futures
+        self._dispatcher = None
+
+    def _take(self) -> float:
+        """Takes a token if one is available, otherwise returns the seconds until it will be"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.granted += 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def _refund(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+            self.granted -= 1
+
+    def acquire_sync(self):
+        if self.rate <= 0:
+            return
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire(self, caller=None):
+        if self.rate <= 0:
+            return
+        if not self._queues and not self._take():
+            return
+        if caller is None:
+            caller = upstream_caller.get()
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(caller, deque()).append(waiter)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await waiter
+
+    async def _dispatch(self):
+        while self._queues:
+            wait = self._take()
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+            caller, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(caller)
+            else:
+                del self._queues[caller]
+            if waiter.done():
+                # Cancelled while waiting, give the token to the next caller
+                self._refund()
+                continue
+            waiter.set_result(None)
+
+    def stats(self):
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "granted": self.granted,
+            "callers_waiting": len(self._queues),
+            "waiting": sum(len(queue) for queue in self._queues.values()),
+        }
+
+
+# Shared by all upstream requests in the process
+upstream_limiter = AdaptiveConcurrencyLimiter()
+upstream_rate_limiter = TokenBucket()
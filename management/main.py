@@ -6,6 +6,46 @@ import time
 import aiohttp
 import asyncio
 from typing import List, Dict, Any, Optional
+from management.cache import fare_cache
+from management.fare_store import fare_store
+from management.fare_index import fare_index, calendar_index
+from management.flight import Flight, get_flight_link
+from management.parser import parse_availability, parse_cheapest_per_day
+from management.planner import plan_search_windows, plan_month_windows, SearchWindow, DEFAULT_FLEX_DAYS
+from management.http import get_http_session
+from management.limiter import upstream_limiter, upstream_rate_limiter, upstream_caller
+from management.singleflight import SingleFlight
+from management.metrics import metrics, upstream_requests_total, upstream_latency
+from management.tracing import tracer, NOOP_SPAN
+from management.aggregate import CheapestPerDestination
+from management.fare_matrix import create_fare_ranking
+from management.destinations import destination_registry
+from configs.config import (AVAILABILITY_URL, CHEAPEST_PER_DAY_URL, UPSTREAM_BACKEND, UPSTREAM_CONCURRENCY_MAX,
+                            UPSTREAM_RETRY_BACKOFF, UPSTREAM_REQUEST_TIMEOUT)
+
+# Per-request timeout for the async client
+UPSTREAM_TIMEOUT = aiohttp.ClientTimeout(total=UPSTREAM_REQUEST_TIMEOUT)
+
+# Identical in-flight upstream requests and identical running searches are shared
+upstream_requests = SingleFlight()
+running_searches = SingleFlight()
+
+# Read at scrape time, nothing is counted twice on the request path
+metrics.gauge("flightbot_fare_cache_lookups_total", "Fare cache lookups by result",
+              lambda: {"hit": fare_cache.hits, "miss": fare_cache.misses}, label="result", kind="counter")
+metrics.gauge("flightbot_fare_cache_hit_ratio", "Share of fare cache lookups served from the cache",
+              lambda: fare_cache.stats()["hit_ratio"])
+metrics.gauge("flightbot_fare_cache_entries", "Request windows held in the fare cache", lambda: len(fare_cache))
+metrics.gauge("flightbot_fare_index_lookups_total", "Fare index coverage checks by result",
+              lambda: {"hit": fare_index.hits, "miss": fare_index.misses}, label="result", kind="counter")
+metrics.gauge("flightbot_in_flight", "Running searches and upstream requests",
+              lambda: {"search": running_searches.in_flight(), "upstream_request": upstream_requests.in_flight()},
+              label="kind")
+metrics.gauge("flightbot_upstream_concurrency", "Adaptive upstream concurrency limit and its current use",
+              lambda: {"limit": upstream_limiter.limit, "in_flight": upstream_limiter.in_flight}, label="state")
+metrics.gauge("flightbot_upstream_queue_depth", "Requests waiting for the upstream rate or concurrency limit",
+              lambda: {"rate": upstream_rate_limiter.stats()["waiting"], "concurrency": upstream_limiter.stats()["waiting"]},
+              label="limit")
 
 
 # List of User-Agents for randomization
@@ -22,23 +62,74 @@ USER_AGENTS = [
 def get_random_user_agent():
     return random.choice(USER_AGENTS)
 
-def get_flight_link(origin, destination, date):
-    """Generates a direct link to a Ryanair flight
+def _flights_from_rows(origin, destination, rows):
+    return [Flight(origin, destination, datetime.fromisoformat(departure), price) for departure, price in rows]
+
+def get_known_flights(cache_key):
+    """Returns flights for a request from the in-process cache or the fare store, None if unknown"""
+    cached = fare_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    return _stored_flights(cache_key)
+
+async def get_known_flights_async(cache_key):
+    """get_known_flights for the event loop: the fare store is read in a worker thread"""
+    cached = fare_cache.get(cache_key)
+    if cached is not None or not fare_store.is_open:
+        return cached
+    return await asyncio.to_thread(_stored_flights, cache_key)
+
+def _stored_flights(cache_key):
+    """Reads a request window from the fare store into the cache and the fare index, blocking"""
+    origin, destination, date_out, flex_before, flex_after = cache_key
+    stored = fare_store.get_window(origin, destination, date_out, flex_before, flex_after)
+    if stored is None:
+        return None
+
+    fetched_at, rows = stored
+    flights = _flights_from_rows(origin, destination, rows)
+    fare_cache.set(cache_key, flights, ttl=min(fare_cache.ttl, fare_store.max_age - (time.time() - fetched_at)))
+    fare_index.add_window(*cache_key, flights, fetched_at=fetched_at)
+    return flights
+
+def remember_flights(cache_key, flights, ttl=None):
+    """Saves a fresh availability result to the cache, the fare index and the fare store
 
     Args:
-        origin: IATA code of the departure airport (e.g. "BER")
-        destination: IATA code of the destination airport (e.g. "BCN")
-        date: departure date, can be in 'YYYY-MM-DD' format or with time 'YYYY-MM-DDThh:mm:ss'
+        ttl: seconds the result counts as fresh in the cache and the index, FARE_CACHE_TTL by default
     """
-    # Make sure we have the correct date format
-    if 'T' in date:
-        formatted_date = date.split('T')[0]
-    else:
-        formatted_date = date
+    fare_cache.set(cache_key, flights, ttl=ttl)
+    fare_index.add_window(*cache_key, flights, max_age=ttl)
+    fare_store.add_window(*cache_key, ((flight.departure.isoformat(), flight.price) for flight in flights))
 
-    return f"https://www.ryanair.com/ua/uk/trip/flights/select?adults=1&teens=0&children=0&infants=0&dateOut={formatted_date}&dateIn=&isConnectedFlight=false&isReturn=false&discount=0&promoCode=&originIata={origin}&destinationIata={destination}&tpAdults=1&tpTeens=0&tpChildren=0&tpInfants=0&tpStartDate={formatted_date}&tpEndDate=&tpDiscount=0&tpPromoCode=&tpOriginIata={origin}&tpDestinationIata={destination}"
+def load_fare_store():
+    """Opens the persistent fare store and warms the in-process cache from it
 
-def get_cheap_flights(origin, destination, date_from, date_to):
+    Blocking, the bot runs it with asyncio.to_thread.
+
+    Returns:
+        Number of request windows loaded into the cache
+    """
+    fare_store.open()
+    if not fare_store.is_open:
+        return 0
+
+    fare_store.prune()
+    loaded = 0
+    now = time.time()
+    for origin, destination, date_out, flex_before, flex_after, fetched_at, rows in fare_store.fresh_windows():
+        cache_key = fare_cache.make_key(origin, destination, date_out, flex_before, flex_after)
+        ttl = min(fare_cache.ttl, fare_store.max_age - (now - fetched_at))
+        flights = _flights_from_rows(origin, destination, rows)
+        fare_cache.set(cache_key, flights, ttl=ttl)
+        fare_index.add_window(origin, destination, date_out, flex_before, flex_after, flights, fetched_at=fetched_at)
+        loaded += 1
+
+    print(f"Warm start: loaded {loaded} fare windows from {fare_store.path}")
+    return loaded
+
+def get_cheap_flights(origin, destination, date_from, date_to,
+                      flex_days_before=DEFAULT_FLEX_DAYS, flex_days_after=DEFAULT_FLEX_DAYS):
     """Get information about cheap flights
 
     Args:
@@ -46,11 +137,19 @@ def get_cheap_flights(origin, destination, date_from, date_to):
         destination: IATA code of the destination airport (e.g. "BCN")
         date_from: start date in YYYY-MM-DD format
         date_to: end date in YYYY-MM-DD format
+        flex_days_before: days before date_from the API also searches
+        flex_days_after: days after date_from the API also searches
     """
     print(f"Searching for flights: {origin} -> {destination}, from {date_from} to {date_to}")
 
+    cache_key = fare_cache.make_key(origin, destination, date_from, flex_days_before, flex_days_after)
+    cached = get_known_flights(cache_key)
+    if cached is not None:
+        print(f"Cache hit: {origin} -> {destination} on {date_from} ({len(cached)} flights)")
+        return cached
+
     # Use a simplified URL for better stability
-    url = "https://www.ryanair.com/api/booking/v4/en-gb/availability"
+    url = AVAILABILITY_URL
     headers = {
         "User-Agent": get_random_user_agent(),
         "Content-Type": "application/json",
@@ -71,48 +170,30 @@ def get_cheap_flights(origin, destination, date_from, date_to):
         "TEEN": 0,  # 0 teenagers
         "promoCode": "",
         "IncludeConnectingFlights": "false",
-        "FlexDaysBeforeOut": 2,  # search 2 days before
-        "FlexDaysOut": 2,  # search 2 days after
+        "FlexDaysBeforeOut": flex_days_before,  # search N days before
+        "FlexDaysOut": flex_days_after,  # search N days after
         "ToUs": "AGREED",
         "RoundTrip": "false"  # one-way only
     }
 
     try:
-        # Add a shorter delay to avoid being blocked
-        time.sleep(random.uniform(0.2, 0.8))  # Уменьшенная задержка
+        # Wait for our turn in the process-wide upstream rate limit
+        upstream_rate_limiter.acquire_sync()
 
         print(f"Sending request to API: {url}")
         # Add a small timeout for requests
+        sent_at = time.perf_counter()
         response = requests.get(url, headers=headers, params=params, timeout=10)  # Shorter timeout
+        upstream_latency.observe(time.perf_counter() - sent_at)
+        upstream_requests_total.inc(str(response.status_code))
 
         print(f"Received response: status {response.status_code}")
         if response.status_code == 200:
             try:
-                data = response.json()
-                flights = []
-
-                # Check the response structure
-                if "trips" in data and len(data["trips"]) > 0:
-                    for trip in data["trips"]:
-                        if "dates" in trip and len(trip["dates"]) > 0:
-                            for date_item in trip["dates"]:
-                                if "flights" in date_item and len(date_item["flights"]) > 0:
-                                    for flight in date_item["flights"]:
-                                        if "regularFare" in flight and "fares" in flight["regularFare"]:
-                                            price = float(flight["regularFare"]["fares"][0]["amount"])
-
-                                            # Get departure date
-                                            departure_date = flight["time"][0]
-                                            flight_link = get_flight_link(origin, destination, departure_date)
-
-                                            flights.append({
-                                                "destination": destination,
-                                                "price": price,
-                                                "date": departure_date,
-                                                "link": flight_link
-                                            })
+                flights = parse_availability(response.content, origin, destination)
 
                 print(f"Found flights: {len(flights)}")
+                remember_flights(cache_key, flights)
                 return flights
             except Exception as json_error:
                 print(f"JSON parsing error: {json_error}")
@@ -121,33 +202,18 @@ def get_cheap_flights(origin, destination, date_from, date_to):
         else:
             print(f"Ryanair API error: {response.status_code}")
             return []
+    except requests.Timeout:
+        upstream_requests_total.inc("timeout")
+        print(f"API request timeout for {destination}")
+        return []
     except Exception as e:
+        upstream_requests_total.inc("error")
         print(f"API request error: {e}")
         return []
 
 def get_popular_destinations_from_berlin():
-    return [
-        {"code": "BCN", "city": "Барселона"},
-        {"code": "ALC", "city": "Аліканте"},
-        {"code": "AGP", "city": "Малага"},
-        {"code": "ATH", "city": "Афіни"},
-        {"code": "VLC", "city": "Валенсія"},
-        {"code": "NAP", "city": "Неаполь"},
-        {"code": "CIA", "city": "Рим"},
-        {"code": "PMI", "city": "Пальма-де-Майорка"},
-        {"code": "LIS", "city": "Лісабон"},
-        {"code": "PRG", "city": "Прага"},
-        {"code": "MXP", "city": "Мілан"},
-        {"code": "BUD", "city": "Будапешт"},
-        {"code": "BRU", "city": "Брюссель"},
-        {"code": "DUB", "city": "Дублін"},
-        {"code": "EDI", "city": "Единбург"},
-        {"code": "FAO", "city": "Фару"},
-        {"code": "OPO", "city": "Порту"},
-        {"code": "PSA", "city": "Піза"},
-        {"code": "VIE", "city": "Відень"},
-        {"code": "ZAG", "city": "Загреб"}
-    ]
+    """Returns the configured destinations, see configs/destinations.json"""
+    return destination_registry.all()
 
 def find_cheapest_flights_from_berlin(date_from=None, date_to=None):
     """Finds the cheapest flights from Berlin to each city for a specified period
@@ -170,49 +236,32 @@ def find_cheapest_flights_from_berlin(date_from=None, date_to=None):
 
     print(f"Searching for cheapest flights from Berlin from {date_from} to {date_to}")
 
-    cheapest_per_city = {}  # Dictionary to store the cheapest flight for each city
+    # Cheapest flight in the period for each destination
+    cheapest = CheapestPerDestination(datetime.strptime(date_from, "%Y-%m-%d").date(),
+                                      datetime.strptime(date_to, "%Y-%m-%d").date())
     destinations = get_popular_destinations_from_berlin()
 
-    # Define dates for search (1 search per month for each destination)
-    search_dates = []
-    current_date = datetime.strptime(date_from, "%Y-%m-%d")
-    end_date = datetime.strptime(date_to, "%Y-%m-%d")
-
-    # Add the first date
-    search_dates.append(current_date.strftime("%Y-%m-%d"))
+    # Requests that cover every day of the range exactly once
+    search_windows = plan_search_windows(date_from, date_to)
 
-    # Add dates every ~30 days
-    while current_date < end_date:
-        current_date += timedelta(days=30)
-        if current_date <= end_date:
-            search_dates.append(current_date.strftime("%Y-%m-%d"))
-
-    print(f"Searching on these dates: {search_dates}")
+    print(f"Searching on these dates: {[window.date_out for window in search_windows]}")
 
     for dest in destinations:
-        print(f"Searching for flights to {dest['city']} ({dest['code']})")
-        all_flights = []
+        print(f"Searching for flights to {dest.city} ({dest.code})")
 
-        # Search for each date
-        for search_date in search_dates:
-            flights = get_cheap_flights("BER", dest["code"], search_date, "")
+        # Search for each window
+        for search_date, flex_before, flex_after in search_windows:
+            flights = get_cheap_flights("BER", dest.code, search_date, "", flex_before, flex_after)
 
             if flights:
-                # Add city name to each flight
-                for flight in flights:
-                    flight["city"] = dest["city"]
-                all_flights.extend(flights)
-                print(f"Found {len(flights)} flights to {dest['city']} on {search_date}")
-
-        if all_flights:
-            # Find the cheapest flight among all dates
-            cheapest_flight = min(all_flights, key=lambda x: x["price"])
-            cheapest_per_city[dest["city"]] = cheapest_flight
-            print(f"Cheapest flight to {dest['city']}: {cheapest_flight['price']}€ on {cheapest_flight['date']}")
-
-    # Convert dictionary to list and sort by price
-    cheapest_flights = list(cheapest_per_city.values())
-    sorted_flights = sorted(cheapest_flights, key=lambda x: x["price"])
+                cheapest.add(flights, dest.city)
+                print(f"Found {len(flights)} flights to {dest.city} on {search_date}")
+
+        cheapest_flight = cheapest.best(dest.code)
+        if cheapest_flight is not None:
+            print(f"Cheapest flight to {dest.city}: {cheapest_flight.price}€ on {cheapest_flight.departure}")
+
+    sorted_flights = cheapest.results()
 
     print(f"Found cheapest flights for {len(sorted_flights)} cities")
     return sorted_flights
@@ -229,7 +278,9 @@ if __name__ == "__main__":
     ic(cheapest_flights[:5])
 
 # Async version of get_cheap_flights
-async def get_cheap_flights_async(origin, destination, date_from, date_to=""):
+async def get_cheap_flights_async(origin, destination, date_from, date_to="",
+                                  flex_days_before=DEFAULT_FLEX_DAYS, flex_days_after=DEFAULT_FLEX_DAYS,
+                                  refresh=False):
     """Async version: Get information about cheap flights
 
     Args:
@@ -237,19 +288,44 @@ async def get_cheap_flights_async(origin, destination, date_from, date_to=""):
         destination: IATA code of the destination airport (e.g. "BCN")
         date_from: start date in YYYY-MM-DD format
         date_to: end date in YYYY-MM-DD format
+        flex_days_before: days before date_from the API also searches
+        flex_days_after: days after date_from the API also searches
+        refresh: skip the cache and fare store and always ask the API
     """
     print(f"Starting async search: {origin} -> {destination}, from {date_from}")
 
-    # Use a simplified URL for better stability
-    url = "https://www.ryanair.com/api/booking/v4/en-gb/availability"
-    headers = {
-        "User-Agent": get_random_user_agent(),
-        "Content-Type": "application/json",
-        "Accept": "application/json, text/plain, */*",
-        "Referer": "https://www.ryanair.com/ua/uk/trip/flights/select",
-        "Origin": "https://www.ryanair.com",
-        "Accept-Language": "uk-UA,uk;q=0.9,en-US;q=0.8,en;q=0.7"
-    }
+    cache_key = fare_cache.make_key(origin, destination, date_from, flex_days_before, flex_days_after)
+    cached = None if refresh else await get_known_flights_async(cache_key)
+    if cached is not None:
+        print(f"Cache hit: {origin} -> {destination} on {date_from} ({len(cached)} flights)")
+        return cached
+
+    flights = await upstream_requests.do(
+        cache_key,
+        lambda: _fetch_flights_async(origin, destination, date_from, flex_days_before, flex_days_after, cache_key)
+    )
+    return list(flights) if flights is not None else []
+
+async def refresh_flights_async(origin, destination, window, ttl=None):
+    """Requests one availability window from the API past the cache, for the prewarmer
+
+    Args:
+        window: SearchWindow to fetch
+        ttl: seconds the result counts as fresh in the cache and the fare index
+
+    Returns:
+        The flights, None if the request failed
+    """
+    cache_key = fare_cache.make_key(origin, destination, window.date_out, window.flex_before, window.flex_after)
+    return await upstream_requests.do(
+        cache_key,
+        lambda: _fetch_flights_async(origin, destination, window.date_out, window.flex_before, window.flex_after,
+                                     cache_key, ttl=ttl)
+    )
+
+async def _fetch_flights_async(origin, destination, date_from, flex_days_before, flex_days_after, cache_key,
+                               ttl=None):
+    """Requests one availability window from the API, with retries, None if every attempt failed"""
     params = {
         "ADT": 1,  # 1 adult
         "CHD": 0,  # 0 children
@@ -262,99 +338,195 @@ async def get_cheap_flights_async(origin, destination, date_from, date_to=""):
         "TEEN": 0,  # 0 teenagers
         "promoCode": "",
         "IncludeConnectingFlights": "false",
-        "FlexDaysBeforeOut": 2,  # search 2 days before
-        "FlexDaysOut": 2,  # search 2 days after
+        "FlexDaysBeforeOut": flex_days_before,  # search N days before
+        "FlexDaysOut": flex_days_after,  # search N days after
         "ToUs": "AGREED",
         "RoundTrip": "false"  # one-way only
     }
 
+    # Use a simplified URL for better stability
+    flights = await _request_upstream_async(
+        AVAILABILITY_URL, params, destination, lambda body: parse_availability(body, origin, destination),
+        date_out=date_from
+    )
+    if flights is None:
+        return None
+
+    print(f"Found {len(flights)} flights for {destination}")
+    remember_flights(cache_key, flights, ttl=ttl)
+    return flights
+
+async def load_month_fares_async(origin, destination, window):
+    """Makes sure the calendar index has the month fare calendar of a route
+
+    One request to the month calendar endpoint puts the cheapest fare of
+    every day of the month into calendar_index. Nothing is requested while
+    the rest of the month is still fresh there. Calendar fares are not
+    confirmed by availability, so they stay out of fare_index.
+
+    Args:
+        origin: IATA code of the departure airport
+        destination: IATA code of the destination airport
+        window: month window from plan_month_windows
+
+    Returns:
+        False if the calendar could not be fetched
+    """
+    first_day = datetime.strptime(window.first_day, "%Y-%m-%d").date()
+    last_day = datetime.strptime(window.last_day, "%Y-%m-%d").date()
+    # Past days of the month are never indexed
+    if calendar_index.covers(origin, destination, max(first_day, datetime.now().date()), last_day):
+        return True
+
+    return await upstream_requests.do(
+        ("month", origin, destination, window.date_out),
+        lambda: _fetch_month_fares_async(origin, destination, window)
+    )
+
+async def _fetch_month_fares_async(origin, destination, window):
+    url = CHEAPEST_PER_DAY_URL.format(origin=origin, destination=destination)
+    params = {"outboundMonthOfDate": window.date_out, "currency": "EUR"}
+    flights = await _request_upstream_async(
+        url, params, destination, lambda body: parse_cheapest_per_day(body, origin, destination),
+        month=window.date_out
+    )
+    if flights is None:
+        return False
+
+    print(f"Found fares on {len(flights)} days of {window.date_out[:7]} for {destination}")
+    calendar_index.add_window(origin, destination, window.date_out, window.flex_before, window.flex_after, flights)
+    return True
+
+async def _request_upstream_async(url, params, destination, parse, **span_args):
+    """GETs one upstream resource through the rate limit and the adaptive concurrency limit, with retries
+
+    Returns:
+        parse(body) of the first successful response, None if every attempt failed
+    """
+    headers = {
+        "User-Agent": get_random_user_agent(),
+        "Content-Type": "application/json",
+        "Accept": "application/json, text/plain, */*",
+        "Referer": "https://www.ryanair.com/ua/uk/trip/flights/select",
+        "Origin": "https://www.ryanair.com",
+        "Accept-Language": "uk-UA,uk;q=0.9,en-US;q=0.8,en;q=0.7"
+    }
+
     # Retry mechanism with exponential backoff
     max_retries = 3
     for retry in range(max_retries):
         try:
-            # Add a longer random delay to prevent API rate limiting
-            # More randomization to avoid pattern detection
-            delay = random.uniform(0.5, 1.5 + retry * 0.5)  # Increase delay on each retry
-            await asyncio.sleep(delay)
-
-            # Log retry attempts
+            # Log retry attempts and back off before trying again
             if retry > 0:
                 print(f"Retry #{retry} for {destination}")
+                with tracer.span("backoff", "sleep", retry=retry):
+                    await asyncio.sleep(UPSTREAM_RETRY_BACKOFF * 2 ** (retry - 1))
+
+            # Wait for our turn in the process-wide upstream rate limit
+            with tracer.span("rate_limit_wait", "queue"):
+                await upstream_rate_limiter.acquire()
 
-            async with aiohttp.ClientSession() as session:
-                # Add timeout to prevent hanging requests
-                try:
-                    async with session.get(url, headers=headers, params=params, timeout=15) as response:
+            session = get_http_session()
+            request_span = NOOP_SPAN
+            # Add timeout to prevent hanging requests
+            try:
+                concurrency_wait = tracer.span("concurrency_wait", "queue")
+                async with upstream_limiter:
+                    concurrency_wait.end()
+                    request_span = tracer.span("request", "network", destination=destination, **span_args)
+                    sent_at = time.perf_counter()
+                    async with session.get(url, headers=headers, params=params, timeout=UPSTREAM_TIMEOUT) as response:
+                        upstream_latency.observe(time.perf_counter() - sent_at)
+                        upstream_requests_total.inc(str(response.status))
+                        request_span.end(status=response.status)
                         print(f"Response for {destination}: status {response.status}")
 
                         if response.status == 200:
+                            upstream_limiter.on_success()
                             try:
-                                data = await response.json()
-                                flights = []
-
-                                # Check the response structure
-                                if "trips" in data and len(data["trips"]) > 0:
-                                    for trip in data["trips"]:
-                                        if "dates" in trip and len(trip["dates"]) > 0:
-                                            for date_item in trip["dates"]:
-                                                if "flights" in date_item and len(date_item["flights"]) > 0:
-                                                    for flight in date_item["flights"]:
-                                                        if "regularFare" in flight and "fares" in flight["regularFare"]:
-                                                            price = float(flight["regularFare"]["fares"][0]["amount"])
-
-                                                            # Get departure date
-                                                            departure_date = flight["time"][0]
-                                                            flight_link = get_flight_link(origin, destination, departure_date)
-
-                                                            flights.append({
-                                                                "destination": destination,
-                                                                "price": price,
-                                                                "date": departure_date,
-                                                                "link": flight_link
-                                                            })
-
-                                print(f"Found {len(flights)} flights for {destination}")
-                                return flights
+                                with tracer.span("read_body", "network"):
+                                    body = await response.read()
+                                with tracer.span("parse", "parse", size=len(body)):
+                                    return parse(body)
                             except Exception as json_error:
                                 print(f"JSON parsing error for {destination}: {json_error}")
                                 # Continue to retry on JSON errors
                         elif response.status == 409:
                             # Conflict error - API rate limiting
                             print(f"Rate limit (409) for {destination}, retrying after delay")
+                            upstream_limiter.on_overload()
                             continue  # Try again after longer delay
                         else:
                             print(f"API error for {destination}: HTTP {response.status}")
                             if retry < max_retries - 1:
                                 continue  # Try again for non-200 responses
-                            return []
-                except asyncio.TimeoutError:
-                    print(f"Request timeout for {destination}")
-                    if retry < max_retries - 1:
-                        continue  # Try again for timeouts
-                    return []
+                            return None
+            except asyncio.TimeoutError:
+                upstream_requests_total.inc("timeout")
+                request_span.end(status="timeout")
+                print(f"Request timeout for {destination}")
+                upstream_limiter.on_overload()
+                if retry < max_retries - 1:
+                    continue  # Try again for timeouts
+                return None
         except Exception as e:
+            upstream_requests_total.inc("error")
             print(f"General error for {destination}: {e}")
             if retry < max_retries - 1:
                 continue  # Try again for general errors
-            return []
+            return None
 
     # If we've exhausted all retries
     print(f"Failed to get flights for {destination} after {max_retries} retries")
-    return []
+    return None
 
-# Async version of find_cheapest_flights_from_berlin
-async def find_cheapest_flights_from_berlin_async(date_from=None, date_to=None):
-    """Find cheapest flights from Berlin asynchronously
+async def _fetch_window(origin, dest, window):
+    return await get_cheap_flights_async(origin, dest.code, window.date_out, "", window.flex_before, window.flex_after)
+
+async def _fetch_month(origin, dest, window):
+    return await load_month_fares_async(origin, dest.code, window)
+
+async def fetch_flights_pool(jobs, origin="BER", caller=None, fetch=_fetch_window):
+    """Fetches (destination, window) jobs with a continuous pool of workers
+
+    Workers pick the next job as soon as they finish the previous one, while
+    upstream_limiter decides how many requests actually run at once. All jobs
+    of one pool share a rate limiter queue, so concurrent searches get equal
+    turns.
 
     Args:
-        date_from: Start date in YYYY-MM-DD format. Defaults to today.
-        date_to: End date in YYYY-MM-DD format. Defaults to date_from + 30 days.
+        fetch: coroutine function (origin, destination, window) doing one job,
+            an availability window by default, _fetch_month for month calendars
 
-    Returns:
-        List of flights found
+    Yields:
+        (destination, window, flights) in completion order; flights is an
+        Exception if the fetch raised
     """
-    print("🔎 Searching for cheapest flights from Berlin...")
+    pending = iter(jobs)
+    results = asyncio.Queue()
+
+    if caller is None:
+        caller = object()
 
+    async def worker():
+        upstream_caller.set(caller)
+        for dest, window in pending:
+            try:
+                with tracer.span("window", "fetch", destination=dest.code, date_out=window.date_out):
+                    flights = await fetch(origin, dest, window)
+            except Exception as e:
+                flights = e
+            await results.put((dest, window, flights))
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(UPSTREAM_CONCURRENCY_MAX, len(jobs)))]
+    try:
+        for _ in range(len(jobs)):
+            yield await results.get()
+    finally:
+        for task in workers:
+            task.cancel()
+
+def _default_period(date_from, date_to):
     # Set default dates if not provided
     if date_from is None:
         date_from = datetime.now().strftime("%Y-%m-%d")
@@ -365,34 +537,60 @@ async def find_cheapest_flights_from_berlin_async(date_from=None, date_to=None):
         date_to_dt = date_from_dt + timedelta(days=30)
         date_to = date_to_dt.strftime("%Y-%m-%d")
 
+    return date_from, date_to
+
+# Async version of find_cheapest_flights_from_berlin
+async def find_cheapest_flights_from_berlin_async(date_from=None, date_to=None):
+    """Find cheapest flights from Berlin asynchronously
+
+    Concurrent calls for the same period share one running search.
+
+    Args:
+        date_from: Start date in YYYY-MM-DD format. Defaults to today.
+        date_to: End date in YYYY-MM-DD format. Defaults to date_from + 30 days.
+
+    Returns:
+        List of flights found
+    """
+    date_from, date_to = _default_period(date_from, date_to)
+    cheapest = create_fare_ranking(get_popular_destinations_from_berlin(),
+                                   datetime.strptime(date_from, "%Y-%m-%d").date(),
+                                   datetime.strptime(date_to, "%Y-%m-%d").date())
+    async for flight in iter_cheapest_flights_from_berlin_async(date_from, date_to):
+        cheapest.offer(flight)
+
+    return cheapest.results()
+
+def iter_cheapest_flights_from_berlin_async(date_from=None, date_to=None):
+    """Streaming variant of find_cheapest_flights_from_berlin_async
+
+    Yields a flight every time a destination gets a new cheapest fare in the
+    period, as the upstream responses arrive. A caller that joins a search
+    already running for the same period first gets everything found so far.
+
+    Args:
+        date_from: Start date in YYYY-MM-DD format. Defaults to today.
+        date_to: End date in YYYY-MM-DD format. Defaults to date_from + 30 days.
+    """
+    date_from, date_to = _default_period(date_from, date_to)
+    return running_searches.stream(
+        ("period", date_from, date_to),
+        lambda: _iter_cheapest_flights_from_berlin_async(date_from, date_to)
+    )
+
+async def _iter_cheapest_flights_from_berlin_async(date_from, date_to):
+    print("🔎 Searching for cheapest flights from Berlin...")
+
     # Calculate total search period in days
-    date_from_dt = datetime.strptime(date_from, "%Y-%m-%d")
-    date_to_dt = datetime.strptime(date_to, "%Y-%m-%d")
-    total_days = (date_to_dt - date_from_dt).days
+    first_day = datetime.strptime(date_from, "%Y-%m-%d").date()
+    last_day = datetime.strptime(date_to, "%Y-%m-%d").date()
+    total_days = (last_day - first_day).days
 
     print(f"Searching for flights from {date_from} to {date_to} ({total_days} days)")
 
-    # Determine search frequency based on period length
-    if total_days <= 10:
-        # For short periods - search every day
-        step_days = 1
-    elif total_days <= 45:
-        # For month period - search every 3 days
-        step_days = 3
-    else:
-        # For three months - search every 5 days
-        step_days = 5
-
-    # Generate search dates
-    search_dates = []
-    current_dt = date_from_dt
-    while current_dt <= date_to_dt:
-        search_dates.append(current_dt.strftime("%Y-%m-%d"))
-        current_dt += timedelta(days=step_days)
-
-    # Make sure we include the end date if it's not already included
-    if date_to_dt.strftime("%Y-%m-%d") not in search_dates:
-        search_dates.append(date_to)
+    # Each request covers up to five days, so only the planned window anchors are queried
+    search_windows = plan_search_windows(date_from, date_to)
+    search_dates = [window.date_out for window in search_windows]
 
     print(f"Will search on {len(search_dates)} dates: {', '.join(search_dates[:5])}...")
     if len(search_dates) > 5:
@@ -402,113 +600,138 @@ async def find_cheapest_flights_from_berlin_async(date_from=None, date_to=None):
     destinations = get_popular_destinations_from_berlin()
     print(f"Will search for flights to {len(destinations)} destinations")
 
-    # Create a list to store all flights
-    all_flights = []
-
-    # Maximum number of concurrent tasks - REDUCED TO 2
-    max_concurrent = 2
-
-    # Process each date
-    for date_str in search_dates:
-        print(f"Searching for flights on {date_str}")
-
-        # Process destinations in batches
-        for i in range(0, len(destinations), max_concurrent):
-            batch = destinations[i:i+max_concurrent]
-            print(f"Processing destinations {i+1}-{i+len(batch)} of {len(destinations)}")
-
-            # Create tasks for all destinations in this batch
-            tasks = []
-            dest_map = {}
-
-            for idx, dest in enumerate(batch):
-                task = asyncio.to_thread(
-                    get_cheap_flights,
-                    "BER",
-                    dest["code"],
-                    date_str,
-                    ""  # Empty string because API will search around the date
-                )
-                tasks.append(task)
-                dest_map[idx] = dest
-
-            # Execute all tasks in the batch simultaneously
-            batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-
-            # Process the results
-            for idx, flights in enumerate(batch_results):
-                dest = dest_map[idx]
-
-                try:
-                    # Skip exceptions
-                    if isinstance(flights, Exception):
-                        print(f"Error finding flights to {dest['city']}: {flights}")
-                        continue
-
-                    if flights:
-                        # Add city name to each flight
-                        for flight in flights:
-                            flight["city"] = dest["city"]
-
-                        # Add all flights to the results
-                        all_flights.extend(flights)
-
-                        # Find and log the cheapest flight for this batch
-                        cheapest_flight = min(flights, key=lambda x: x["price"])
-                        print(f"Found cheapest flight to {dest['city']} on {date_str}: {cheapest_flight['price']}€")
-                except Exception as e:
-                    print(f"Error processing flights to {dest['city']}: {e}")
-
-        # Short pause between date batches to reduce API load
-        await asyncio.sleep(1)
-
-    # Filter out flights that are outside our date range
-    filtered_flights = []
-    for flight in all_flights:
-        try:
-            flight_date = datetime.strptime(flight['date'].split('T')[0], '%Y-%m-%d')
-            if date_from_dt <= flight_date <= date_to_dt:
-                filtered_flights.append(flight)
-        except Exception as e:
-            print(f"Error filtering flight: {e}")
+    # Cheapest flight in the period found so far for each destination
+    cheapest = create_fare_ranking(destinations, first_day, last_day)
 
-    print(f"Found {len(filtered_flights)} flights in total after filtering")
+    # Destinations whose whole period was fetched recently are answered by the fare index
+    pending = []
+    for dest in destinations:
+        if not fare_index.covers("BER", dest.code, first_day, last_day):
+            pending.append(dest)
+            continue
+        flight = fare_index.cheapest("BER", dest.code, first_day, last_day)
+        if flight is not None and cheapest.offer(flight._replace(city=dest.city)):
+            yield cheapest.best(dest.code)
+    if len(pending) < len(destinations):
+        print(f"Answered {len(destinations) - len(pending)} destinations from the fare index")
+
+    # A month calendar request plus one confirming request per destination against one request per window
+    month_windows = plan_month_windows(date_from, date_to)
+    use_calendar = UPSTREAM_BACKEND == "calendar" and len(month_windows) + 1 < len(search_windows)
+
+    with tracer.trace("period_search", date_from=date_from, date_to=date_to, destinations=len(pending),
+                      backend="calendar" if use_calendar else "availability"):
+        if use_calendar and pending:
+            failed = []
+            async for flight in _iter_calendar_search(pending, month_windows, first_day, last_day, failed):
+                if cheapest.offer(flight):
+                    yield flight
+            # Destinations without a calendar are searched window by window
+            pending = failed
+
+        # Every (window, destination) pair left is one upstream request
+        jobs = [(dest, window) for window in search_windows for dest in pending]
+        async for dest, window, flights in fetch_flights_pool(jobs):
+            try:
+                # Skip exceptions
+                if isinstance(flights, Exception):
+                    print(f"Error finding flights to {dest.city}: {flights}")
+                    continue
 
-    # Group flights by destination
-    flights_by_dest = {}
-    for flight in filtered_flights:
-        dest = flight["city"]
-        if dest not in flights_by_dest:
-            flights_by_dest[dest] = []
-        flights_by_dest[dest].append(flight)
+                # Only in-range flights that beat the destination's best so far are kept
+                improved = cheapest.add(flights, dest.city)
+                if improved is not None:
+                    print(f"New cheapest flight to {dest.city} from window {window.date_out}: {improved.price}€")
+                    yield improved
+            except Exception as e:
+                print(f"Error processing flights to {dest.city}: {e}")
 
-    # Find cheapest flight for each destination
-    cheapest_flights = []
-    for dest, flights in flights_by_dest.items():
-        if flights:
-            cheapest_flight = min(flights, key=lambda x: x["price"])
-            cheapest_flights.append(cheapest_flight)
+    print(f"Found cheapest flights for {len(cheapest)}/{len(destinations)} destinations")
 
-    # Sort by price
-    sorted_flights = sorted(cheapest_flights, key=lambda x: x["price"])
+async def _iter_calendar_search(destinations, month_windows, first_day, last_day, failed, origin="BER"):
+    """Period search on the month fare calendar endpoint
 
-    print(f"Found cheapest flights for {len(sorted_flights)}/{len(destinations)} destinations")
-    return sorted_flights
+    One request per destination and month fills calendar_index with the
+    cheapest fare of every day. The cheapest day of each destination is then
+    confirmed with a one-day availability request, for the exact flight and
+    the live fare of the date that is shown. Only confirmed fares are yielded.
+
+    Yields:
+        the confirmed cheapest flight of each destination; destinations whose
+        calendar could not be fetched or whose cheapest day could not be
+        confirmed are appended to failed instead
+    """
+    broken = set()
+    jobs = [(dest, window) for window in month_windows for dest in destinations]
+    async for dest, window, loaded in fetch_flights_pool(jobs, origin, fetch=_fetch_month):
+        if loaded is not True:
+            print(f"No fare calendar for {dest.city} in {window.date_out[:7]}: {loaded}")
+            broken.add(dest.code)
+    failed.extend(dest for dest in destinations if dest.code in broken)
+
+    candidates = {}
+    for dest in destinations:
+        if dest.code not in broken:
+            flight = calendar_index.cheapest(origin, dest.code, first_day, last_day)
+            if flight is not None:
+                candidates[dest.code] = flight._replace(city=dest.city)
+    print(f"Fare calendars found fares for {len(candidates)}/{len(destinations)} destinations")
+
+    # Only the day shown for each destination is requested from availability
+    jobs = [(dest, SearchWindow(candidates[dest.code].day.strftime("%Y-%m-%d"), 0, 0))
+            for dest in destinations if dest.code in candidates]
+    async for dest, window, flights in fetch_flights_pool(jobs, origin):
+        if isinstance(flights, Exception):
+            print(f"Could not confirm the fare to {dest.city} on {window.date_out}: {flights}")
+            failed.append(dest)
+            continue
+
+        day_flights = [flight for flight in flights if flight.day == candidates[dest.code].day]
+        if day_flights:
+            yield min(day_flights, key=lambda flight: flight.price)._replace(city=dest.city)
+            continue
+
+        # Sold out since the calendar was built or the request failed, the calendar's next day is no surer
+        print(f"No confirmed fare to {dest.city} on {window.date_out}, searching the period instead")
+        failed.append(dest)
 
 # Simpler async version to search all cities for specific date
 async def search_all_cities_for_date_async(date_str):
     """Async search for the cheapest flights to all cities on a specific date
 
+    Concurrent calls for the same date share one running search.
+
     Args:
         date_str: The date to search in YYYY-MM-DD format
 
     Returns:
         List of cheapest flights for each city on that date
     """
+    all_results = [flight async for flight in iter_all_cities_for_date_async(date_str)]
+
+    # Sort by price
+    return sorted(all_results, key=lambda x: x.price)
+
+def iter_all_cities_for_date_async(date_str):
+    """Streaming variant of search_all_cities_for_date_async
+
+    Yields the cheapest flight of each city on/around the date as soon as its
+    response arrives. A caller that joins a search already running for the
+    same date first gets everything found so far.
+
+    Args:
+        date_str: The date to search in YYYY-MM-DD format
+    """
+    return running_searches.stream(
+        ("date", date_str),
+        lambda: _iter_all_cities_for_date_async(date_str)
+    )
+
+async def _iter_all_cities_for_date_async(date_str):
     print(f"Starting search for flights on {date_str}")
 
     # Parse the date string to a datetime object
-    search_date = datetime.strptime(date_str, "%Y-%m-%d")
+    search_date = datetime.strptime(date_str, "%Y-%m-%d").date()
 
     # Create a small date range around the selected date (+/- 1 day)
     # This is because the API might not have exact flights on the exact date
@@ -519,75 +742,39 @@ async def search_all_cities_for_date_async(date_str):
 
     # Get destinations
     destinations = get_popular_destinations_from_berlin()
+    # Only flights within 1 day of the selected date count
+    cheapest = CheapestPerDestination(search_date - timedelta(days=1), search_date + timedelta(days=1))
 
-    # Create a list to store the results
-    all_results = []
-
-    # Process in batches - REDUCED TO 2 concurrent requests
-    max_concurrent = 2
-
-    for i in range(0, len(destinations), max_concurrent):
-        batch = destinations[i:i+max_concurrent]
-        print(f"Processing destinations {i+1}-{i+len(batch)} of {len(destinations)}")
-
-        # Create tasks for all destinations in this batch
-        tasks = []
-        dest_map = {}
-
-        for idx, dest in enumerate(batch):
-            task = asyncio.to_thread(
-                get_cheap_flights,
-                "BER",
-                dest["code"],
-                date_str,
-                ""  # Empty string because API will search around the date
-            )
-            tasks.append(task)
-            dest_map[idx] = dest
-
-        # Execute all tasks in the batch simultaneously
-        batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # Process the results
-        for idx, flights in enumerate(batch_results):
-            dest = dest_map[idx]
-
+    # Destinations whose days around the date were fetched recently are answered by the fare index
+    pending = []
+    for dest in destinations:
+        if not fare_index.covers("BER", dest.code, search_date - timedelta(days=1), search_date + timedelta(days=1)):
+            pending.append(dest)
+            continue
+        flight = fare_index.cheapest_around("BER", dest.code, search_date, 1)
+        if flight is not None and cheapest.offer(flight._replace(city=dest.city)):
+            yield cheapest.best(dest.code)
+    if len(pending) < len(destinations):
+        print(f"Answered {len(destinations) - len(pending)} destinations from the fare index")
+
+    # The API searches +/- 2 days around date_str, so one request per destination is enough
+    jobs = [(dest, SearchWindow(date_str, DEFAULT_FLEX_DAYS, DEFAULT_FLEX_DAYS)) for dest in pending]
+
+    with tracer.trace("date_search", date=date_str, jobs=len(jobs)):
+        async for dest, _, flights in fetch_flights_pool(jobs):
             try:
                 # Skip exceptions
                 if isinstance(flights, Exception):
-                    print(f"Error finding flights to {dest['city']}: {flights}")
+                    print(f"Error finding flights to {dest.city}: {flights}")
                     continue
 
-                # Filter flights to make sure they're close to our selected date
-                filtered_flights = []
-                if flights:
-                    for flight in flights:
-                        # Add city name to each flight
-                        flight["city"] = dest["city"]
-
-                        # Parse the flight date to check if it's within our range
-                        try:
-                            flight_date = datetime.strptime(flight['date'].split('T')[0], '%Y-%m-%d')
-                            # Only include flights within 1 day of selected date
-                            date_diff = abs((flight_date - search_date).days)
-                            if date_diff <= 1:
-                                filtered_flights.append(flight)
-                        except Exception as e:
-                            print(f"Error parsing flight date: {e}")
-
-                # If we have flights after filtering
-                if filtered_flights:
-                    # Find the cheapest flight for this city
-                    cheapest_flight = min(filtered_flights, key=lambda x: x["price"])
-                    all_results.append(cheapest_flight)
-
-                    print(f"Found {len(filtered_flights)} flights to {dest['city']} on/around {date_str}")
-                    print(f"Cheapest flight: {cheapest_flight['price']}€ on {cheapest_flight['date'].split('T')[0]}")
+                # One window per destination, so its first in-range result is the answer
+                cheapest_flight = cheapest.add(flights, dest.city)
+                if cheapest_flight is not None:
+                    print(f"Cheapest flight to {dest.city} on/around {date_str}: "
+                          f"{cheapest_flight.price}€ on {cheapest_flight.day}")
+                    yield cheapest_flight
             except Exception as e:
-                print(f"Error processing flights to {dest['city']}: {e}")
+                print(f"Error processing flights to {dest.city}: {e}")
 
-    # Sort by price
-    sorted_flights = sorted(all_results, key=lambda x: x["price"])
-
-    print(f"Found cheapest flights for {len(sorted_flights)}/{len(destinations)} cities on date {date_str}")
-    return sorted_flights
+    print(f"Found cheapest flights for {len(cheapest)}/{len(destinations)} cities on date {date_str}")
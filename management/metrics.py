@@ -0,0 +1,160 @@
+import logging
+from bisect import bisect_left
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds in seconds, +Inf is implied
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15)
+SEARCH_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 180, 300)
+
+
+def _format_labels(label, value):
+    return f'{{{label}="{value}"}}' if label and value is not None else ""
+
+
+class Counter:
+    """Monotonic counter with at most one label
+
+    inc() is a dict lookup and an addition, cheap enough for every upstream
+    request. Increments from worker threads are not locked, a lost increment
+    under contention is acceptable for monitoring.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, label: str = None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values = {}
+
+    def inc(self, label_value=None, amount: float = 1):
+        self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def get(self, label_value=None):
+        return self._values.get(label_value, 0)
+
+    def samples(self):
+        for label_value, value in list(self._values.items()):
+            yield self.name + _format_labels(self.label, label_value), value
+
+
+class Histogram:
+    """Histogram with fixed buckets and at most one label
+
+    observe() only bumps the matching bucket; the cumulative counts the text
+    format needs are computed at scrape time.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS, label: str = None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label value -> [per-bucket counts + overflow, sum, count]
+
+    def observe(self, value: float, label_value=None):
+        series = self._series.get(label_value)
+        if series is None:
+            series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self):
+        for label_value, (counts, total, count) in list(self._series.items()):
+            prefix = f'{self.label}="{label_value}",' if self.label and label_value is not None else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                yield f'{self.name}_bucket{{{prefix}le="{le}"}}', cumulative
+            yield self.name + "_sum" + _format_labels(self.label, label_value), total
+            yield self.name + "_count" + _format_labels(self.label, label_value), count
+
+
+class CallbackMetric:
+    """Value read from its owner at scrape time, costs nothing in between
+
+    The callback returns a number, or a dict of label value -> number.
+    """
+
+    def __init__(self, name: str, help: str, callback, label: str = None, kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.callback = callback
+        self.label = label
+        self.kind = kind
+
+    def samples(self):
+        value = self.callback()
+        if isinstance(value, dict):
+            for label_value, item in value.items():
+                yield self.name + _format_labels(self.label, label_value), item
+        else:
+            yield self.name, value
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def counter(self, name: str, help: str, label: str = None) -> Counter:
+        return self._register(Counter(name, help, label))
+
+    def histogram(self, name: str, help: str, buckets=LATENCY_BUCKETS, label: str = None) -> Histogram:
+        return self._register(Histogram(name, help, buckets, label))
+
+    def gauge(self, name: str, help: str, callback, label: str = None, kind: str = "gauge") -> CallbackMetric:
+        return self._register(CallbackMetric(name, help, callback, label, kind))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                logger.warning(f"Не вдалося зібрати метрику {metric.name}: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name} {float(value)!r}" for name, value in samples)
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+
+# Shared by the whole process
+metrics = MetricsRegistry()
+
+upstream_requests_total = metrics.counter(
+    "flightbot_upstream_requests_total", "Ryanair API requests by HTTP status, timeout or error", label="status")
+upstream_latency = metrics.histogram(
+    "flightbot_upstream_latency_seconds", "Time from sending a Ryanair API request to its response headers")
+search_duration = metrics.histogram(
+    "flightbot_search_duration_seconds", "Duration of user searches by type", SEARCH_BUCKETS, label="type")
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(body=metrics.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Serves /metrics on a side port, for polling mode where there is no web app"""
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики доступні на http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,65 @@
+from datetime import datetime
+from typing import List
+
+from management.flight import Flight
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson is optional, stdlib json is ~2-3x slower on these payloads
+    import json
+    _loads = json.loads
+
+
+def parse_availability(body, origin: str, destination: str) -> List[Flight]:
+    """Flattens a Ryanair availability response into Flight records
+
+    Walks trips -> dates -> flights once and keeps only the departure time and
+    the adult regular fare. Sold-out flights (faresLeft == 0) and flights
+    without a regular fare are skipped.
+
+    Args:
+        body: raw response body (bytes or str)
+        origin: IATA code of the departure airport of the request
+        destination: IATA code of the destination airport of the request
+    """
+    data = _loads(body)
+    flights = []
+    append = flights.append
+    parse_time = datetime.fromisoformat
+    for trip in data.get("trips") or ():
+        for date_item in trip.get("dates") or ():
+            for flight in date_item.get("flights") or ():
+                if flight.get("faresLeft") == 0:
+                    continue
+                regular_fare = flight.get("regularFare")
+                if not regular_fare:
+                    continue
+                fares = regular_fare.get("fares")
+                if fares:
+                    append(Flight(origin, destination, parse_time(flight["time"][0]), float(fares[0]["amount"])))
+    return flights
+
+
+def parse_cheapest_per_day(body, origin: str, destination: str) -> List[Flight]:
+    """Flattens a farfnd cheapestPerDay (month fare calendar) response into Flight records
+
+    One record per day that has a fare: the cheapest flight of the day, at
+    its departureDate when the response has one and at midnight of the day
+    otherwise. Sold-out and unavailable days are skipped.
+
+    Args:
+        body: raw response body (bytes or str)
+        origin: IATA code of the departure airport of the request
+        destination: IATA code of the destination airport of the request
+    """
+    data = _loads(body)
+    flights = []
+    parse_time = datetime.fromisoformat
+    for fare in (data.get("outbound") or {}).get("fares") or ():
+        price = fare.get("price")
+        if not price or price.get("value") is None or fare.get("soldOut") or fare.get("unavailable"):
+            continue
+        departure = fare.get("departureDate") or fare.get("day")
+        flights.append(Flight(origin, destination, parse_time(departure), float(price["value"])))
+    return flights
@@ -0,0 +1,98 @@
+from datetime import date, datetime, timedelta
+from typing import List, NamedTuple
+
+# The availability API returns FlexDaysBeforeOut + 1 + FlexDaysOut days per request
+DEFAULT_FLEX_DAYS = 2
+
+
+class SearchWindow(NamedTuple):
+    date_out: str
+    flex_before: int
+    flex_after: int
+
+    @property
+    def first_day(self) -> str:
+        return (datetime.strptime(self.date_out, "%Y-%m-%d") - timedelta(days=self.flex_before)).strftime("%Y-%m-%d")
+
+    @property
+    def last_day(self) -> str:
+        return (datetime.strptime(self.date_out, "%Y-%m-%d") + timedelta(days=self.flex_after)).strftime("%Y-%m-%d")
+
+
+def plan_search_windows(date_from: str, date_to: str, flex_days: int = DEFAULT_FLEX_DAYS) -> List[SearchWindow]:
+    """Computes the smallest set of availability requests covering [date_from, date_to]
+
+    Windows are laid out back to back starting at date_from, each one covering
+    2 * flex_days + 1 days. The last window is shrunk so that every day of the
+    range is requested exactly once.
+
+    Args:
+        date_from: first day in YYYY-MM-DD format
+        date_to: last day (inclusive) in YYYY-MM-DD format
+        flex_days: maximum FlexDaysBeforeOut/FlexDaysOut the API accepts
+
+    Returns:
+        List of SearchWindow(date_out, flex_before, flex_after) sorted by date
+    """
+    start = datetime.strptime(date_from, "%Y-%m-%d")
+    end = datetime.strptime(date_to, "%Y-%m-%d")
+    width = 2 * flex_days + 1
+
+    windows = []
+    current = start
+    while current <= end:
+        remaining = (end - current).days + 1
+        span = min(width, remaining)
+        flex_before = min(flex_days, span - 1)
+        flex_after = span - 1 - flex_before
+        anchor = current + timedelta(days=flex_before)
+        windows.append(SearchWindow(anchor.strftime("%Y-%m-%d"), flex_before, flex_after))
+        current += timedelta(days=span)
+
+    return windows
+
+
+def plan_grid_windows(date_from: str, date_to: str, flex_days: int = DEFAULT_FLEX_DAYS) -> List[SearchWindow]:
+    """Covers [date_from, date_to] with windows on a fixed grid of days
+
+    Unlike plan_search_windows, the tiling does not depend on date_from: a
+    window always spans the 2 * flex_days + 1 days whose ordinals divide into
+    the same block, so the same days give the same windows from one day to
+    the next. Only the first window is clipped to date_from, the last one
+    runs to the end of its block.
+    """
+    start = date.fromisoformat(date_from).toordinal()
+    end = date.fromisoformat(date_to).toordinal()
+    width = 2 * flex_days + 1
+
+    windows = []
+    block = start // width
+    while block * width <= end:
+        first = max(block * width, start)
+        span = block * width + width - first
+        flex_before = min(flex_days, span - 1)
+        flex_after = span - 1 - flex_before
+        windows.append(SearchWindow(date.fromordinal(first + flex_before).isoformat(), flex_before, flex_after))
+        block += 1
+
+    return windows
+
+
+def plan_month_windows(date_from: str, date_to: str) -> List[SearchWindow]:
+    """One window per calendar month touched by [date_from, date_to], for the month calendar endpoint
+
+    Each window is anchored on the first of the month and covers the whole
+    month (flex_before 0, flex_after days in the month - 1), because the
+    endpoint always answers for a whole month.
+    """
+    start = datetime.strptime(date_from, "%Y-%m-%d").replace(day=1)
+    end = datetime.strptime(date_to, "%Y-%m-%d")
+
+    windows = []
+    current = start
+    while current <= end:
+        next_month = (current + timedelta(days=32)).replace(day=1)
+        windows.append(SearchWindow(current.strftime("%Y-%m-%d"), 0, (next_month - current).days - 1))
+        current = next_month
+
+    return windows
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+from configs.config import SEARCH_PERIODS, PREWARM_RATE, PREWARM_REFRESH_INTERVALS
+from management.limiter import upstream_caller
+from management.cache import fare_cache
+from management.main import refresh_flights_async, get_popular_destinations_from_berlin
+from management.planner import plan_grid_windows
+
+logger = logging.getLogger(__name__)
+
+
+class FarePrewarmer:
+    """Background crawler that keeps the whole destination x horizon fare space fresh
+
+    The space is every day up to the longest of the SEARCH_PERIODS, tiled with
+    windows on a fixed grid of days (plan_grid_windows), so a window keeps its
+    key and its refresh time from one day to the next. User searches are
+    answered from the fare index that the crawl keeps filled. Windows are
+    refreshed by distance from today: PREWARM_REFRESH_INTERVALS maps "up to N
+    days ahead" to a refresh interval in seconds, and a fetched window stays
+    fresh in the cache and the index a little past its next refresh. The
+    most overdue window is fetched next, at most PREWARM_RATE requests per
+    second, and the requests queue as their own caller in the global rate
+    limiter so user searches keep their share. A failed request is retried
+    on the next round instead of waiting for its interval.
+    """
+
+    # A window stays fresh for this many refresh intervals, the crawl can run late
+    TTL_INTERVALS = 1.5
+    IDLE = (60, None, None)
+
+    def __init__(self, rate: float = PREWARM_RATE, periods=tuple(SEARCH_PERIODS.values()),
+                 refresh_intervals=PREWARM_REFRESH_INTERVALS):
+        self.rate = rate
+        self.periods = periods
+        self.refresh_intervals = sorted(refresh_intervals.items())
+        self.fetches = 0
+        self._refreshed = {}  # (destination code, window) -> monotonic time of the last fetch
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running or self.rate <= 0:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Prewarm started: {max(self.periods)} days ahead, {self.rate} requests/s")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def refresh_interval(self, days_ahead: int) -> float:
+        for max_days, interval in self.refresh_intervals:
+            if days_ahead <= max_days:
+                return interval
+        return self.refresh_intervals[-1][1]
+
+    def ttl(self, days_ahead: int) -> float:
+        """Seconds a prewarmed window counts as fresh, never less than a user search result"""
+        return max(fare_cache.ttl, self.refresh_interval(days_ahead) * self.TTL_INTERVALS)
+
+    def planned_windows(self):
+        today = datetime.now()
+        return plan_grid_windows(today.strftime("%Y-%m-%d"),
+                                 (today + timedelta(days=max(self.periods))).strftime("%Y-%m-%d"))
+
+    def next_job(self, now: float):
+        """Returns (seconds until due, destination, window) for the most overdue window, IDLE if there is none"""
+        today = datetime.now()
+
+        best = None
+        for window in self.planned_windows():
+            days_ahead = (datetime.strptime(window.date_out, "%Y-%m-%d") - today).days
+            interval = self.refresh_interval(days_ahead)
+            for dest in get_popular_destinations_from_berlin():
+                last = self._refreshed.get((dest.code, window))
+                due_in = -float("inf") if last is None else last + interval - now
+                if best is None or due_in < best[0]:
+                    best = (due_in, dest, window)
+        return best or self.IDLE
+
+    def status(self):
+        return {"running": self.running, "fetches": self.fetches, "windows": len(self._refreshed)}
+
+    async def _run(self):
+        upstream_caller.set("prewarm")
+        while True:
+            try:
+                now = time.monotonic()
+                due_in, dest, window = self.next_job(now)
+                if dest is None or due_in > 0:
+                    await asyncio.sleep(min(due_in, 60))
+                    continue
+
+                days_ahead = (datetime.strptime(window.date_out, "%Y-%m-%d") - datetime.now()).days
+                flights = await refresh_flights_async("BER", dest.code, window, ttl=self.ttl(days_ahead))
+                self.fetches += 1
+                if flights is not None:
+                    self._refreshed[(dest.code, window)] = time.monotonic()
+                self._forget_unplanned_windows()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Prewarm error: {e}")
+
+            await asyncio.sleep(1 / self.rate)
+
+    def _forget_unplanned_windows(self):
+        planned = set(self.planned_windows())
+        for key in [key for key in self._refreshed if key[1] not in planned]:
+            del self._refreshed[key]
+
+
+prewarmer = FarePrewarmer()
@@ -0,0 +1,42 @@
+import time
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from configs.config import PROGRESS_EDIT_INTERVAL
+
+
+class ThrottledEditor:
+    """Edits a progress message at most once per interval
+
+    Updates that arrive too soon after the previous edit are skipped, only the
+    latest text matters. flush() writes it out regardless of the interval.
+    """
+
+    def __init__(self, message, interval: float = PROGRESS_EDIT_INTERVAL):
+        self.message = message
+        self.interval = interval
+        self._text = None
+        self._shown = None
+        self._next_edit = 0.0
+
+    async def update(self, text: str, **kwargs):
+        self._text = text
+        if time.monotonic() >= self._next_edit:
+            await self._edit(**kwargs)
+
+    async def flush(self, **kwargs):
+        await self._edit(**kwargs)
+
+    async def _edit(self, **kwargs):
+        if self._text is None or self._text == self._shown:
+            return
+        self._next_edit = time.monotonic() + self.interval
+        try:
+            await self.message.edit_text(self._text, **kwargs)
+            self._shown = self._text
+        except TelegramRetryAfter as e:
+            # Telegram asked us to slow down, skip updates until then
+            self._next_edit = time.monotonic() + e.retry_after
+        except TelegramBadRequest:
+            # "message is not modified" and similar are harmless for progress updates
+            pass
@@ -0,0 +1,83 @@
+from typing import List, Optional, Sequence
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from management.flight import Flight
+
+# Telegram limit for a message text, in UTF-16 code units
+TELEGRAM_TEXT_LIMIT = 4096
+RESULTS_PER_PAGE = 5
+
+PAGE_CALLBACK_PREFIX = "page_"
+
+
+def utf16_len(text: str) -> int:
+    """Length as Telegram counts it: characters outside the BMP (most emoji) take two units"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def short_link(flight: Flight) -> str:
+    """Booking link without the empty query parameters, which carry nothing"""
+    parts = urlsplit(flight.link)
+    query = urlencode([(key, value) for key, value in parse_qsl(parts.query) if value], safe="")
+    return urlunsplit(parts._replace(query=query))
+
+
+def format_flight(flight: Flight, show_city: bool = True) -> str:
+    """One result entry in Markdown"""
+    lines = []
+    if show_city:
+        lines.append(f"🛫 {flight.city}")
+    lines.append(f"💰 Ціна: {flight.price}€")
+    lines.append(f"📅 Дата: {flight.departure.strftime('%d.%m.%Y')}, {flight.departure.strftime('%H:%M')}")
+    lines.append(f"🔗 [Забронювати]({short_link(flight)})")
+    return "\n".join(lines)
+
+
+def paginate(header: str, entries: Sequence[str], per_page: int = RESULTS_PER_PAGE,
+             limit: int = TELEGRAM_TEXT_LIMIT) -> List[str]:
+    """Splits entries into message texts that each fit into one Telegram message
+
+    A page takes up to per_page entries and fewer when the next one would
+    push it over the limit. Lengths are counted on the Markdown source, which
+    is never shorter than the parsed text, so a page cannot be rejected.
+    Multi-page results get a "page i/n" footer. Entries are never split, one
+    entry is a few hundred characters at most.
+    """
+    footer_reserve = utf16_len("\n\nСторінка 999/999")
+    budget = limit - utf16_len(header) - footer_reserve
+    separator = utf16_len("\n\n")
+
+    chunks = []
+    current, used = [], 0
+    for entry in entries:
+        size = utf16_len(entry)
+        extra = size if not current else size + separator
+        if current and (len(current) >= per_page or used + extra > budget):
+            chunks.append(current)
+            current, used = [], 0
+            extra = size
+        current.append(entry)
+        used += extra
+    if current or not chunks:
+        chunks.append(current)
+
+    if len(chunks) == 1:
+        return [header + "\n\n".join(chunks[0])]
+    return [
+        header + "\n\n".join(chunk) + f"\n\nСторінка {number}/{len(chunks)}"
+        for number, chunk in enumerate(chunks, 1)
+    ]
+
+
+def page_keyboard(page: int, total: int) -> Optional[InlineKeyboardMarkup]:
+    """Prev/next buttons for a paged result, None when everything fits on one page"""
+    if total <= 1:
+        return None
+    row = []
+    if page > 0:
+        row.append(InlineKeyboardButton(text="◀️ Назад", callback_data=f"{PAGE_CALLBACK_PREFIX}{page - 1}"))
+    if page < total - 1:
+        row.append(InlineKeyboardButton(text="Далі ▶️", callback_data=f"{PAGE_CALLBACK_PREFIX}{page + 1}"))
+    return InlineKeyboardMarkup(inline_keyboard=[row])
@@ -0,0 +1,90 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from configs.config import SESSION_MAX_ENTRIES, SESSION_IDLE_TTL
+
+
+class Session:
+    """Per-user search state between a keyboard tap and the calendar/period callback"""
+
+    __slots__ = ("city", "search_type", "period", "date_from", "date_to", "search_message_id",
+                 "results", "results_header", "results_show_city", "results_message_id", "last_seen")
+
+    def __init__(self, city: Optional[str] = None, search_type: str = "specific_city"):
+        self.city = city
+        self.search_type = search_type
+        self.period = None
+        self.date_from = None
+        self.date_to = None
+        self.search_message_id = None
+        # Flights of the last search and its header, the page buttons render pages from them
+        self.results = ()
+        self.results_header = ""
+        self.results_show_city = True
+        self.results_message_id = None
+        self.last_seen = time.monotonic()
+
+
+class SessionStore:
+    """Bounded LRU map of user id -> Session with idle expiry
+
+    Entries are kept in last-access order, so both the least recently used
+    entry and the idle ones sit at the front and are dropped in O(1) each.
+    """
+
+    def __init__(self, max_entries: int = SESSION_MAX_ENTRIES, idle_ttl: float = SESSION_IDLE_TTL):
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self.evicted = 0
+        self.expired = 0
+        self._sessions = OrderedDict()
+
+    def get(self, user_id) -> Optional[Session]:
+        self._expire()
+        session = self._sessions.get(user_id)
+        if session is not None:
+            session.last_seen = time.monotonic()
+            self._sessions.move_to_end(user_id)
+        return session
+
+    def set(self, user_id, session: Session) -> Session:
+        self._expire()
+        session.last_seen = time.monotonic()
+        self._sessions[user_id] = session
+        self._sessions.move_to_end(user_id)
+        while len(self._sessions) > self.max_entries:
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+        return session
+
+    def get_or_create(self, user_id) -> Session:
+        session = self.get(user_id)
+        if session is None:
+            session = self.set(user_id, Session())
+        return session
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def live_count(self) -> int:
+        """Number of sessions that have not been idle for idle_ttl, expired ones are dropped first"""
+        self._expire()
+        return len(self._sessions)
+
+    def stats(self):
+        return {
+            "sessions": self.live_count(),
+            "max_entries": self.max_entries,
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
+
+    def _expire(self):
+        deadline = time.monotonic() - self.idle_ttl
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if session.last_seen > deadline:
+                break
+            del self._sessions[user_id]
+            self.expired += 1
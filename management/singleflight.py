@@ -0,0 +1,90 @@
+import asyncio
+
+
+class SharedStream:
+    """Runs an async generator once and replays its items to any number of subscribers"""
+
+    def __init__(self, agen):
+        self.items = []
+        self.done = False
+        self.error = None
+        self._changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._pump(agen))
+
+    async def _pump(self, agen):
+        try:
+            async for item in agen:
+                self.items.append(item)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self):
+        position = 0
+        while True:
+            changed = self._changed
+            while position < len(self.items):
+                yield self.items[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one running task
+
+    The first caller starts the work, callers arriving while it runs await the
+    same task and get the same result (or exception). The task is shielded, so
+    a caller that gives up does not cancel the work for the others.
+    stream() does the same for async generators: late subscribers first get
+    the items produced so far, then the live ones.
+    """
+
+    def __init__(self):
+        self.started = 0
+        self.shared = 0
+        self._calls = {}
+
+    async def do(self, key, factory):
+        task = self._calls.get(key)
+        if task is None or task.done():
+            task = asyncio.ensure_future(factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.started += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def stream(self, key, factory):
+        shared = self._calls.get(key)
+        # A finished call may still be registered until its done callback runs
+        if shared is None or shared.done:
+            shared = SharedStream(factory())
+            self._calls[key] = shared
+            shared.task.add_done_callback(lambda done: self._forget(key, shared))
+            self.started += 1
+        else:
+            self.shared += 1
+        return shared.subscribe()
+
+    def in_flight(self):
+        return len(self._calls)
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        task = call.task if isinstance(call, SharedStream) else call
+        if not task.cancelled():
+            # Mark the exception as retrieved in case every caller went away
+            task.exception()
@@ -0,0 +1,244 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import signal
+import threading
+import time
+
+from configs.config import TRACE_ENABLED, TRACE_PATH
+
+logger = logging.getLogger(__name__)
+
+# Trace of the search the current task works for, inherited by the tasks it starts
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class _NoopSpan:
+    """Returned while tracing is off or outside a traced search, does nothing"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def end(self, **args):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """One timed step of a search
+
+    Works as a context manager or with an explicit end(), for steps that do
+    not map onto a block (e.g. waiting for `async with limiter`). Ending a
+    span twice is harmless, a span that is never ended is not recorded.
+    """
+
+    __slots__ = ("trace", "name", "cat", "args", "start", "lane")
+
+    def __init__(self, trace, name, cat, args):
+        self.trace = trace
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.lane = trace.lane()
+        self.start = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.end()
+        return False
+
+    def end(self, **args):
+        trace = self.trace
+        if trace is None:
+            return
+        self.trace = None
+        if args:
+            self.args.update(args)
+        trace.record(self, time.perf_counter())
+
+
+class Trace:
+    """Spans of one search, exported when its root span ends"""
+
+    def __init__(self, tracer, number, name, args):
+        self.tracer = tracer
+        self.number = number
+        self.events = []
+        self.totals = {}
+        self._lanes = {}
+        self.root = Span(self, name, "search", args)
+
+    def lane(self):
+        """Small per-task number, so spans of concurrent workers get their own rows in the viewer"""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = id(task) if task is not None else threading.get_ident()
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = len(self._lanes) + 1
+        return lane
+
+    def record(self, span, end):
+        duration = end - span.start
+        self.events.append((span.name, span.cat, span.start, duration, span.lane, span.args))
+        if span is not self.root:
+            self.totals[span.cat] = self.totals.get(span.cat, 0.0) + duration
+            self.totals[span.name + "_count"] = self.totals.get(span.name + "_count", 0) + 1
+        else:
+            self.tracer.export(self, duration)
+
+
+class _RootSpan:
+    """Context manager that makes a new trace current for the block"""
+
+    __slots__ = ("trace", "token")
+
+    def __init__(self, trace):
+        self.trace = trace
+        self.token = None
+
+    def __enter__(self):
+        self.token = _current_trace.set(self.trace)
+        return self.trace.root
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.trace.root.args["error"] = exc_type.__name__
+        self.trace.root.end()
+        try:
+            _current_trace.reset(self.token)
+        except ValueError:
+            # An async generator finalized from another context, nothing to restore there
+            pass
+        return False
+
+
+class Tracer:
+    """Per-search tracing of the fan-out pipeline
+
+    tracer.trace() opens a search, tracer.span() times a step inside it. While
+    tracing is off trace() is a flag check and span() a context variable
+    lookup, both return a shared no-op span. Finished searches are logged as
+    one structured line with the time per category (queue, sleep, network,
+    parse; summed over all workers, so it can exceed the wall time) and,
+    with a path set, appended to a Chrome trace file (chrome://tracing or
+    ui.perfetto.dev). The file is serialized and written in a worker thread,
+    a large trace took tens of milliseconds on the event loop; drain() waits
+    for the writes still running.
+    """
+
+    def __init__(self, enabled: bool = TRACE_ENABLED, path: str = TRACE_PATH):
+        self.enabled = enabled
+        self.path = path or None
+        self.exported = 0
+        self._traces = 0
+        self._lock = threading.Lock()
+        self._epoch = time.perf_counter()
+        self._write_tasks = set()
+
+    def enable(self, path: str = None):
+        if path is not None:
+            self.path = path or None
+        self.enabled = True
+        logger.info(f"Трасування увімкнено{f', файл {self.path}' if self.path else ''}")
+
+    def disable(self):
+        self.enabled = False
+        logger.info("Трасування вимкнено")
+
+    def toggle(self):
+        self.disable() if self.enabled else self.enable()
+
+    def install_signal_toggle(self, sig=getattr(signal, "SIGUSR1", None)):
+        """Switches tracing on and off on a signal (`kill -USR1 <pid>`), where the platform supports it"""
+        if sig is None:
+            return
+        try:
+            asyncio.get_running_loop().add_signal_handler(sig, self.toggle)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    def trace(self, name: str, **args):
+        if not self.enabled:
+            return NOOP_SPAN
+        with self._lock:
+            self._traces += 1
+            number = self._traces
+        return _RootSpan(Trace(self, number, name, args))
+
+    def span(self, name: str, cat: str, **args):
+        trace = _current_trace.get()
+        if trace is None:
+            return NOOP_SPAN
+        return Span(trace, name, cat, args)
+
+    def export(self, trace, wall):
+        self.exported += 1
+        summary = {"trace": trace.number, "search": trace.root.name, **trace.root.args, "wall": round(wall, 3)}
+        summary.update((key, round(value, 3) if isinstance(value, float) else value)
+                       for key, value in sorted(trace.totals.items()))
+        logger.info(f"trace {json.dumps(summary, ensure_ascii=False)}")
+        if not self.path:
+            return
+
+        # Spans of workers still running may end after the root, the writer gets the events so far
+        events = list(trace.events)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # A worker thread of the sync path, it can afford to write itself
+            self._write_chrome_events(self.path, trace.number, trace.root.name, events)
+            return
+        task = loop.create_task(asyncio.to_thread(self._write_chrome_events, self.path, trace.number,
+                                                  trace.root.name, events))
+        self._write_tasks.add(task)
+        task.add_done_callback(self._write_done)
+
+    def _write_done(self, task):
+        self._write_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Не вдалося записати трасу: {task.exception()!r}")
+
+    async def drain(self):
+        """Waits for the trace files still being written, call it before the loop stops"""
+        if self._write_tasks:
+            await asyncio.gather(*self._write_tasks, return_exceptions=True)
+
+    def _write_chrome_events(self, path, number, search, events):
+        """Appends a trace to a Chrome "JSON Array Format" file, one process row per search; blocking"""
+        lines = [json.dumps({"name": "process_name", "ph": "M", "pid": number,
+                             "args": {"name": f"{search} #{number}"}})]
+        for name, cat, start, duration, lane, args in events:
+            lines.append(json.dumps({
+                "name": name, "cat": cat, "ph": "X", "pid": number, "tid": lane,
+                "ts": round((start - self._epoch) * 1e6, 1), "dur": round(duration * 1e6, 1), "args": args,
+            }, ensure_ascii=False, default=str))
+        try:
+            with self._lock:
+                new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+                with open(path, "a", encoding="utf-8") as f:
+                    # The closing bracket is optional in this format, so the file can be appended to
+                    if new_file:
+                        f.write("[\n")
+                    f.write(",\n".join(lines) + ",\n")
+        except OSError as e:
+            logger.warning(f"Не вдалося записати трасу в {path}: {e}")
+
+
+# Shared by the whole process
+tracer = Tracer()
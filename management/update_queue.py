@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from collections import OrderedDict
+
+from configs.config import WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE, WEBHOOK_DRAIN_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateQueue:
+    """Bounded queue of Telegram updates processed by a pool of async workers
+
+    The webhook only validates and submits updates, so Telegram gets its 200
+    immediately while slow searches run in the workers. Updates redelivered
+    with an update_id seen recently are acknowledged and dropped. When the
+    queue is full submit() returns False and the webhook answers with an error,
+    so Telegram retries later instead of the bot accepting unbounded work.
+    Updates already acknowledged are finished on stop(), within a timeout.
+    """
+
+    def __init__(self, handler, workers: int = WEBHOOK_WORKERS, max_size: int = WEBHOOK_QUEUE_SIZE,
+                 remember_ids: int = 10000):
+        self.handler = handler
+        self.workers = workers
+        self.max_size = max_size
+        self.remember_ids = remember_ids
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.busy = 0
+        self._queue = None
+        self._tasks = []
+        self._seen_ids = OrderedDict()
+        self._closed = False
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._closed = False
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Update queue started: {self.workers} workers, up to {self.max_size} updates")
+
+    async def stop(self, timeout: float = WEBHOOK_DRAIN_TIMEOUT):
+        """Stops taking updates, waits up to timeout seconds for the queued ones, then stops the workers"""
+        self._closed = True
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Update queue not drained in {timeout}s, dropping {self.depth} queued updates")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, update) -> bool:
+        """Queues an update, returns False if it was rejected because the queue is full or stopping"""
+        if self._closed:
+            self.rejected += 1
+            return False
+        if update.update_id in self._seen_ids:
+            self.duplicates += 1
+            return True
+        try:
+            self._queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logger.warning(f"Update queue is full, rejecting update {update.update_id}")
+            return False
+
+        self._seen_ids[update.update_id] = None
+        if len(self._seen_ids) > self.remember_ids:
+            self._seen_ids.popitem(last=False)
+        self.enqueued += 1
+        return True
+
+    @property
+    def depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self):
+        return {
+            "depth": self.depth,
+            "max_size": self.max_size,
+            "workers": self.workers,
+            "busy_workers": self.busy,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+        }
+
+    async def _worker(self):
+        while True:
+            update = await self._queue.get()
+            self.busy += 1
+            try:
+                await self.handler(update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Помилка при обробці оновлення {update.update_id}: {e}")
+            finally:
+                self.busy -= 1
+                self._queue.task_done()
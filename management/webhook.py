@@ -1,9 +1,12 @@
+import asyncio
+import gc
 import logging
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
 from aiogram import Bot, Dispatcher, types
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from aiohttp import web
-from configs.config import TELEGRAM_BOT_TOKEN, WEBHOOK_URL, WEBHOOK_PATH, WEBAPP_HOST, WEBAPP_PORT
+from configs.config import TELEGRAM_BOT_TOKEN, WEBHOOK_URL, WEBHOOK_PATH, WEBAPP_HOST, WEBAPP_PORT, ASYNCIO_SLOW_CALLBACK
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,10 +19,42 @@ import os
 # Додаємо батьківську директорію до шляху імпорту
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from bot import *
+from management.main import load_fare_store
+from management.fare_store import fare_store
+from management.http import start_http_session, close_http_session
+from management.prewarm import prewarmer
+from management.tracing import tracer
+from management.update_queue import UpdateQueue
+from management.metrics import metrics, CONTENT_TYPE
 
 app = FastAPI(title="Telegram Bot Webhook")
 
+update_queue = UpdateQueue(lambda update: dp.feed_update(bot=bot, update=update))
+metrics.gauge("flightbot_update_queue_depth", "Webhook updates waiting for a worker", lambda: update_queue.depth)
+metrics.gauge("flightbot_update_queue_busy_workers", "Workers processing an update", lambda: update_queue.busy)
+
+# Заповнюється при старті, щоб "/" не ходив у Telegram на кожен запит
+bot_info = None
+
 async def on_startup():
+    global bot_info
+    if ASYNCIO_SLOW_CALLBACK:
+        # Log every handler step that blocks the event loop for longer than the threshold
+        loop = asyncio.get_running_loop()
+        loop.set_debug(True)
+        loop.slow_callback_duration = ASYNCIO_SLOW_CALLBACK
+
+    logger.info("Завантажуємо збережені ціни...")
+    await asyncio.to_thread(load_fare_store)
+    # Startup objects live as long as the process, full collections walking them stalled the loop for ~0.2 s
+    gc.freeze()
+    await start_http_session()
+    prewarmer.start()
+    tracer.install_signal_toggle()
+    update_queue.start()
+
+    bot_info = await bot.get_me()
+
     logger.info("Видаляємо старий webhook...")
     await bot.delete_webhook(drop_pending_updates=True)
 
@@ -33,26 +68,39 @@ async def on_startup():
 async def on_shutdown():
     logger.info("Вимикаємо бота...")
     await bot.delete_webhook()
+    await update_queue.stop()
     await bot.session.close()
+    await prewarmer.stop()
+    await tracer.drain()
+    await close_http_session()
+    await asyncio.to_thread(fare_store.close)
 
 @app.post(WEBHOOK_PATH)
 async def bot_webhook(request: Request):
     try:
         update = types.Update(**await request.json())
-        await dp.feed_update(bot=bot, update=update)
-        return {'ok': True}
     except Exception as e:
         logger.error(f"Помилка при обробці webhook: {e}")
         return {'ok': False, 'error': str(e)}
 
+    # Відповідаємо одразу, оновлення обробляє пул воркерів
+    if not update_queue.submit(update):
+        return JSONResponse(status_code=503, content={'ok': False, 'error': 'update queue is full or stopping'})
+    return {'ok': True}
+
 @app.get("/")
 async def root():
     return {
         "status": "Bot is running",
         "webhook_url": f"{WEBHOOK_URL}{WEBHOOK_PATH}",
-        "bot_info": await bot.get_me()
+        "update_queue": update_queue.stats(),
+        "bot_info": bot_info
     }
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
 @app.on_event("startup")
 async def startup_event():
     await on_startup()
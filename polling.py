@@ -1,7 +1,14 @@
 import asyncio
+import gc
 import logging
 from aiogram import Bot, Dispatcher
-from configs.config import TELEGRAM_BOT_TOKEN
+from configs.config import TELEGRAM_BOT_TOKEN, ASYNCIO_SLOW_CALLBACK, METRICS_HOST, METRICS_PORT
+from management.main import load_fare_store
+from management.fare_store import fare_store
+from management.http import start_http_session, close_http_session
+from management.prewarm import prewarmer
+from management.tracing import tracer
+from management.metrics import start_metrics_server
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -12,11 +19,34 @@ dp = Dispatcher()
 from bot import *
 
 async def main():
+    if ASYNCIO_SLOW_CALLBACK:
+        # Log every handler step that blocks the event loop for longer than the threshold
+        loop = asyncio.get_running_loop()
+        loop.set_debug(True)
+        loop.slow_callback_duration = ASYNCIO_SLOW_CALLBACK
+
+    logger.info("Завантажуємо збережені ціни...")
+    await asyncio.to_thread(load_fare_store)
+    # Startup objects live as long as the process, full collections walking them stalled the loop for ~0.2 s
+    gc.freeze()
+    await start_http_session()
+    prewarmer.start()
+    tracer.install_signal_toggle()
+    metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+
     logger.info("Видаляємо webhook...")
     await bot.delete_webhook(drop_pending_updates=True)
 
     logger.info("Запускаємо бота...")
-    await dp.start_polling(bot, allowed_updates=["message", "callback_query"])
+    try:
+        await dp.start_polling(bot, allowed_updates=["message", "callback_query"])
+    finally:
+        await prewarmer.stop()
+        await tracer.drain()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await close_http_session()
+        await asyncio.to_thread(fare_store.close)
 
 if __name__ == "__main__":
     asyncio.run(main())
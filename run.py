@@ -20,9 +20,17 @@ logger = logging.getLogger(__name__)
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Запуск бота дешевих рейсів")
     parser.add_argument("--webhook", action="store_true", help="Запустити через webhook замість polling")
+    parser.add_argument("--fare-store", help="Шлях до SQLite бази з цінами (порожній рядок вимикає її)")
+    parser.add_argument("--metrics-port", type=int, help="Порт для /metrics у режимі polling")
 
     args = parser.parse_args()
 
+    if args.fare_store is not None:
+        # Має бути встановлено до імпорту configs.config
+        os.environ["FARE_STORE_PATH"] = args.fare_store
+    if args.metrics_port is not None:
+        os.environ["METRICS_PORT"] = str(args.metrics_port)
+
     if args.webhook:
         logger.info("Запуск бота через webhook...")
         from management.webhook import main
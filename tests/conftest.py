@@ -0,0 +1,17 @@
+import os
+import socket
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# The client reads its settings at import time, so configure it before any test module imports it
+os.environ["RYANAIR_API_URL"] = f"http://127.0.0.1:{_free_port()}"
+os.environ["FARE_STORE_PATH"] = ""
+os.environ["UPSTREAM_RATE"] = "0"
+os.environ["UPSTREAM_RETRY_BACKOFF"] = "0.01"
+os.environ["PROGRESS_EDIT_INTERVAL"] = "0.05"
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "1:test")
@@ -0,0 +1,67 @@
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from management.aggregate import CheapestPerDestination
+from management.flight import Flight
+
+FIRST_DAY = date(2030, 6, 1)
+
+
+def random_responses(rng):
+    responses = []
+    for _ in range(rng.randrange(1, 15)):
+        destination = f"D{rng.randrange(8)}"
+        flights = [
+            Flight("BER", destination,
+                   datetime.combine(FIRST_DAY, datetime.min.time()) + timedelta(days=rng.randrange(-5, 35),
+                                                                                  hours=rng.randrange(24)),
+                   rng.randrange(1000, 9000) / 100)
+            for _ in range(rng.randrange(0, 10))
+        ]
+        responses.append((f"City {destination}", flights))
+    return responses
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_streaming_minimum_matches_brute_force(seed):
+    rng = random.Random(seed)
+    responses = random_responses(rng)
+    first_day, last_day = FIRST_DAY, FIRST_DAY + timedelta(days=rng.randrange(0, 30))
+
+    cheapest = CheapestPerDestination(first_day, last_day, top_k=3)
+    improvements = []
+    for city, flights in responses:
+        improvements.append(cheapest.add(flights, city))
+
+    in_range = [flight for _, flights in responses for flight in flights
+                if first_day <= flight.departure.date() <= last_day]
+    destinations = {flight.destination for flight in in_range}
+    assert len(cheapest) == len(destinations)
+    for destination in destinations:
+        prices = sorted(flight.price for flight in in_range if flight.destination == destination)
+        assert cheapest.best(destination).price == prices[0]
+        assert [flight.price for flight in cheapest.top(destination)] == prices[:3]
+        assert cheapest.best(destination).city == f"City {destination}"
+    assert [flight.price for flight in cheapest.results()] == sorted(
+        min(flight.price for flight in in_range if flight.destination == destination) for destination in destinations)
+
+    # add() reports a fare exactly when the response lowered its destination's best
+    seen = {}
+    for (city, flights), improved in zip(responses, improvements):
+        kept = [flight for flight in flights if first_day <= flight.departure.date() <= last_day]
+        best = min((flight.price for flight in kept), default=None)
+        lowered = best is not None and (flights[0].destination not in seen or best < seen[flights[0].destination])
+        assert (improved is not None) == lowered
+        if lowered:
+            seen[flights[0].destination] = best
+            assert improved.price == best
+
+
+def test_offer_skips_the_range_check():
+    cheapest = CheapestPerDestination(FIRST_DAY, FIRST_DAY)
+    late = Flight("BER", "BCN", datetime(2030, 7, 1, 8), 10.0, "Barcelona")
+    assert cheapest.offer(late)
+    assert not cheapest.offer(late._replace(price=12.0))
+    assert cheapest.results() == [late]
@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+import bot
+from management.destinations import Destination, DestinationRegistry, destination_registry
+
+
+def test_registry_loads_and_looks_up(tmp_path):
+    path = tmp_path / "destinations.json"
+    path.write_text(json.dumps({"origin": "BER", "destinations": [
+        {"code": " bcn ", "city": "Барселона "},
+        {"code": "ALC", "city": "Аліканте"},
+    ]}), encoding="utf-8")
+    registry = DestinationRegistry.load(str(path))
+
+    assert registry.all() == (Destination("BCN", "Барселона"), Destination("ALC", "Аліканте"))
+    assert registry.by_code("bcn ") == Destination("BCN", "Барселона")
+    assert registry.by_city("  БАРСЕЛОНА") == Destination("BCN", "Барселона")
+    assert registry.by_code("XXX") is None
+    assert "alc" in registry and "XXX" not in registry and None not in registry
+    assert [dest.code for dest in registry] == ["BCN", "ALC"]
+
+
+def test_duplicate_codes_are_rejected():
+    with pytest.raises(ValueError):
+        DestinationRegistry([Destination("BCN", "Barcelona"), Destination("bcn", "Barcelona again")])
+
+
+def test_cities_keyboard_is_built_once_from_the_registry():
+    keyboard = bot.create_cities_keyboard()
+    assert bot.create_cities_keyboard() is keyboard
+
+    buttons = [button for row in keyboard.inline_keyboard for button in row]
+    assert [button.callback_data for button in buttons] == [f"city_{dest.code}" for dest in destination_registry]
+    assert all(len(row) <= 2 for row in keyboard.inline_keyboard)
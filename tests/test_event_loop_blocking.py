@@ -0,0 +1,236 @@
+"""Обробники бота не блокують цикл подій
+
+Кожен сценарій проганяє обробники проти локальної заглушки Ryanair
+(StubRyanair) на циклі asyncio у режимі налагодження. Крок, довший за
+SLOW_CALLBACK, asyncio записує в лог як "Executing ... took", і тест падає.
+Сховище цін відкрите у тимчасовому файлі; запити SQLite з потоку циклу
+теж вважаються блокуванням, навіть якщо встигли швидше за поріг.
+
+    python -m pytest -q tests
+"""
+import asyncio
+import gc
+import json
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+import pytest
+
+import bot
+from benchmarks.stub_server import StubRyanair
+from configs.config import RYANAIR_API_URL
+from management.cache import fare_cache
+from management.calendar_factory import CalendarCallbackFactory
+from management.destinations import destination_registry
+from management.fare_index import fare_index, calendar_index
+from management.fare_store import fare_store
+from management.flight import Flight
+from management.http import start_http_session, close_http_session
+from management.main import load_fare_store
+from management.sessions import Session
+from management.tracing import tracer
+
+# As the bot does after startup, or a full collection over the imported modules trips the threshold
+gc.freeze()
+
+SLOW_CALLBACK = 0.1
+# conftest.py points the client at a free local port, the stub is started there
+STUB_PORT = urlsplit(RYANAIR_API_URL).port
+USER_ID = 1
+
+
+class FakeMessage:
+    """The part of aiogram's Message the handlers use, keeps every text it was given"""
+
+    message_id = 1
+
+    def __init__(self):
+        self.texts = []
+
+    async def edit_text(self, text, **kwargs):
+        self.texts.append(text)
+        return self
+
+    async def answer(self, text, **kwargs):
+        self.texts.append(text)
+        return self
+
+    async def edit_reply_markup(self, reply_markup=None, **kwargs):
+        return self
+
+
+class FakeCallback:
+    """The part of aiogram's CallbackQuery the handlers use"""
+
+    def __init__(self, data, message=None):
+        self.data = data
+        self.from_user = SimpleNamespace(id=USER_ID)
+        self.message = message or FakeMessage()
+        self.answers = []
+
+    async def answer(self, text=None, **kwargs):
+        self.answers.append(text)
+
+
+class SlowCallbacks(logging.Handler):
+    """Collects the slow callback warnings of asyncio's debug mode"""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.messages = []
+
+    def emit(self, record):
+        message = record.getMessage()
+        if message.startswith("Executing "):
+            self.messages.append(message)
+
+
+def callback_handler(name):
+    # Looked up on the dispatcher, bot.py reuses some handler names for message handlers
+    return next(handler.callback for handler in bot.dp.callback_query.handlers
+                if handler.callback.__name__ == name)
+
+
+def calendar_day(days_ahead):
+    day = date.today() + timedelta(days=days_ahead)
+    return CalendarCallbackFactory(act="DAY", year=day.year, month=day.month, day=day.day)
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(tmp_path):
+    fare_cache.clear()
+    fare_index.clear()
+    calendar_index.clear()
+    fare_store.path = str(tmp_path / "fares.sqlite3")
+    yield
+    fare_store.close()
+
+
+def run_on_debug_loop(scenario):
+    """Runs scenario() against the stub, fails on slow callbacks and on SQLite calls from the loop thread"""
+    slow = SlowCallbacks()
+    asyncio_logger = logging.getLogger("asyncio")
+    asyncio_logger.addHandler(slow)
+    sqlite_threads = set()
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        loop.slow_callback_duration = SLOW_CALLBACK
+        stub = StubRyanair(latency=0.01)
+        await stub.start(port=STUB_PORT)
+        await asyncio.to_thread(load_fare_store)
+        # Called on the thread that runs the statement
+        fare_store._conn.set_trace_callback(lambda statement: sqlite_threads.add(threading.get_ident()))
+        await start_http_session()
+        try:
+            await scenario()
+            await asyncio.to_thread(fare_store.close)
+        finally:
+            await close_http_session()
+            await stub.stop()
+        return stub.stats()
+
+    try:
+        stats = asyncio.run(main(), debug=True)
+    finally:
+        asyncio_logger.removeHandler(slow)
+
+    assert not slow.messages, "\n".join(slow.messages)
+    assert threading.get_ident() not in sqlite_threads, "SQLite was called on the event loop thread"
+    return stats
+
+
+def test_specific_city_date_search():
+    destination = next(iter(destination_registry))
+    message = FakeMessage()
+
+    async def scenario():
+        bot.user_sessions.set(USER_ID, Session(city=destination.code, search_type="specific_city"))
+        await bot.process_calendar(FakeCallback("calendar", message), calendar_day(3))
+        # The second search is answered by the cache and the fare store lookup
+        fare_cache.clear()
+        await bot.process_calendar(FakeCallback("calendar", message), calendar_day(3))
+        await callback_handler("handle_result_page")(FakeCallback("page_0", message))
+
+    stats = run_on_debug_loop(scenario)
+    assert stats["requests"] == 1
+    assert message.texts[-1].startswith(f"Знайдені рейси до міста {destination.city}")
+
+
+def test_all_cities_date_search():
+    message = FakeMessage()
+
+    async def scenario():
+        bot.user_sessions.set(USER_ID, Session(city=None, search_type="all_cities"))
+        await bot.process_calendar(FakeCallback("calendar", message), calendar_day(5))
+
+    stats = run_on_debug_loop(scenario)
+    assert stats["requests"] == len(destination_registry)
+    assert message.texts[-1].startswith("🔥 Найдешевші рейси на")
+
+
+def test_period_search_and_calendar_heatmap():
+    message = FakeMessage()
+
+    async def scenario():
+        await callback_handler("handle_period_selection")(FakeCallback("period_week", message))
+        bot.user_sessions.set(USER_ID, Session(city=None, search_type="all_cities"))
+        today = date.today()
+        await bot.process_calendar(
+            FakeCallback("calendar", message),
+            CalendarCallbackFactory(act="NEXT-MONTH", year=today.year, month=today.month, day=1)
+        )
+
+    stats = run_on_debug_loop(scenario)
+    assert stats["requests"] > 0
+    assert message.texts[-1].startswith("🔥 Найдешевші рейси на найближчий тиждень")
+
+
+def test_traced_searches_write_the_trace_off_the_loop(tmp_path, monkeypatch):
+    path = tmp_path / "trace.json"
+    monkeypatch.setattr(tracer, "enabled", True)
+    monkeypatch.setattr(tracer, "path", str(path))
+    writer_threads = set()
+    write_chrome_events = tracer._write_chrome_events
+
+    def recording_write(*args):
+        writer_threads.add(threading.get_ident())
+        write_chrome_events(*args)
+
+    monkeypatch.setattr(tracer, "_write_chrome_events", recording_write)
+    message = FakeMessage()
+
+    async def scenario():
+        await callback_handler("handle_period_selection")(FakeCallback("period_month", message))
+        bot.user_sessions.set(USER_ID, Session(city=None, search_type="all_cities"))
+        await bot.process_calendar(FakeCallback("calendar", message), calendar_day(5))
+        await tracer.drain()
+
+    run_on_debug_loop(scenario)
+    assert writer_threads and threading.get_ident() not in writer_threads
+    events = json.loads(path.read_text(encoding="utf-8").rstrip(",\n") + "]")
+    assert {"period_search", "date_search"} <= {event["name"] for event in events}
+
+
+def test_result_page_callbacks_are_guarded():
+    message = FakeMessage()
+    session = Session(city=None, search_type="all_cities")
+    departure = datetime.combine(date.today() + timedelta(days=3), datetime.min.time())
+    session.results = tuple(Flight("BER", f"D{number:02d}", departure, 10.0 + number, f"Місто {number}")
+                            for number in range(12))
+    session.results_header = "header\n\n"
+    session.results_message_id = message.message_id
+    bot.user_sessions.set(USER_ID, session)
+    handle_result_page = callback_handler("handle_result_page")
+
+    malformed = FakeCallback("page_x", message)
+    asyncio.run(handle_result_page(malformed))
+    assert malformed.answers == ["Ці результати вже застаріли, повторіть пошук"]
+    assert not message.texts
+
+    # Out of range pages are clamped to the last one
+    asyncio.run(handle_result_page(FakeCallback("page_99", message)))
+    assert message.texts[-1].endswith("Сторінка 3/3")
@@ -0,0 +1,74 @@
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from management.fare_index import FareIndex
+from management.flight import Flight
+
+DAYS = 60
+NOW = 1_000_000.0
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_queries_match_brute_force(seed):
+    rng = random.Random(seed)
+    today = date.today()
+    index = FareIndex(days=DAYS + 1, max_age=600)
+    known = {}  # day -> (cheapest flight or None, fetched_at, fresh_until), as the last window left it
+
+    for _ in range(40):
+        destination = "BCN"
+        flex_before, flex_after = rng.randrange(3), rng.randrange(3)
+        anchor = today + timedelta(days=rng.randrange(flex_before, DAYS - flex_after))
+        first_day = anchor - timedelta(days=flex_before)
+        flights = [
+            Flight("BER", destination,
+                   datetime.combine(first_day + timedelta(days=rng.randrange(-1, flex_before + flex_after + 2)),
+                                    datetime.min.time()) + timedelta(hours=rng.randrange(24)),
+                   rng.randrange(1000, 9000) / 100)
+            for _ in range(rng.randrange(0, 6))
+        ]
+        fetched_at = NOW - rng.randrange(0, 1200)
+        max_age = rng.choice([None, 300, 3600])
+        index.add_window("BER", destination, anchor.isoformat(), flex_before, flex_after, flights,
+                         fetched_at=fetched_at, max_age=max_age)
+        fresh_until = fetched_at + (600 if max_age is None else max_age)
+        for offset in range(flex_before + flex_after + 1):
+            day = first_day + timedelta(days=offset)
+            on_day = [flight for flight in flights if flight.departure.date() == day]
+            known[day] = (min(on_day, key=lambda flight: flight.price, default=None), fetched_at, fresh_until)
+
+    for _ in range(200):
+        first_day = today + timedelta(days=rng.randrange(DAYS))
+        last_day = min(first_day + timedelta(days=rng.randrange(8)), today + timedelta(days=DAYS - 1))
+        days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+
+        now = NOW + rng.randrange(-100, 1000)
+        expected_cover = all(day in known and known[day][2] >= now for day in days)
+        assert index.covers("BER", "BCN", first_day, last_day, now=now) == expected_cover
+
+        prices = [known[day][0].price for day in days if day in known and known[day][0] is not None]
+        cheapest = index.cheapest("BER", "BCN", first_day, last_day)
+        assert (cheapest.price if cheapest else None) == (min(prices) if prices else None)
+
+        max_age = rng.choice([300, 900])
+        expected_days = {day: known[day][0].price for day in days
+                         if day in known and known[day][0] is not None and known[day][1] >= now - max_age}
+        assert index.day_prices("BER", "BCN", first_day, last_day, max_age=max_age, now=now) == expected_days
+
+
+def test_unknown_routes_and_ranges_outside_the_index():
+    index = FareIndex(days=10)
+    today = date.today()
+    assert not index.covers("BER", "BCN", today, today)
+    assert index.cheapest("BER", "BCN", today, today) is None
+
+    flight = Flight("BER", "BCN", datetime.combine(today, datetime.min.time()), 20.0)
+    index.add_window("BER", "BCN", today.isoformat(), 0, 0, [flight])
+    assert index.covers("BER", "BCN", today, today)
+    assert index.cheapest("BER", "BCN", today, today) == flight
+    # Past the indexed days and reversed ranges are never covered
+    assert not index.covers("BER", "BCN", today, today + timedelta(days=20))
+    assert not index.covers("BER", "BCN", today + timedelta(days=1), today)
+    assert index.top_destinations("BER", today, today, 5) == [flight]
@@ -0,0 +1,69 @@
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from management.aggregate import CheapestPerDestination
+from management.destinations import Destination
+from management.fare_matrix import FareMatrixRanking, NumpyFareMatrix, PythonFareMatrix, create_fare_ranking
+from management.flight import Flight
+
+FIRST_DAY = date(2030, 3, 1)
+DAYS = 30
+DESTINATIONS = [Destination(f"D{number:02d}", f"City {number}") for number in range(40)]
+
+
+def random_responses(seed):
+    rng = random.Random(seed)
+    responses = []
+    for dest in DESTINATIONS:
+        flights = []
+        # A few days before and after the grid, the ranking must skip them
+        for _ in range(rng.randrange(0, 25)):
+            departure = datetime.combine(FIRST_DAY, datetime.min.time()) + timedelta(
+                days=rng.randrange(-3, DAYS + 3), minutes=rng.randrange(6 * 60, 22 * 60, 5))
+            flights.append(Flight("BER", dest.code, departure, rng.randrange(999, 30000) / 100))
+        responses.append((dest, flights))
+    return responses
+
+
+def rank(ranking, responses):
+    for dest, flights in responses:
+        ranking.add(flights, dest.city)
+    return ranking.results()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_engines_rank_like_the_plain_ranking(seed):
+    pytest.importorskip("numpy")
+    responses = random_responses(seed)
+    last_day = FIRST_DAY + timedelta(days=DAYS - 1)
+
+    expected = rank(CheapestPerDestination(FIRST_DAY, last_day), responses)
+    for matrix_class in (PythonFareMatrix, NumpyFareMatrix):
+        matrix = matrix_class(DESTINATIONS, FIRST_DAY, DAYS)
+        results = rank(FareMatrixRanking(matrix, FIRST_DAY, last_day), responses)
+        assert [(f.destination, f.price) for f in results] == [(f.destination, f.price) for f in expected]
+        assert all(flight.city for flight in results)
+
+    python = PythonFareMatrix(DESTINATIONS, FIRST_DAY, DAYS)
+    numpy = NumpyFareMatrix(DESTINATIONS, FIRST_DAY, DAYS)
+    for _, flights in responses:
+        python.add(flights)
+        numpy.add(flights)
+    window = (FIRST_DAY + timedelta(days=5), FIRST_DAY + timedelta(days=12))
+    assert python.cheapest(*window) == numpy.cheapest(*window)
+    assert python.top(7, *window) == numpy.top(7, *window)
+
+
+def test_ranking_engine_switch(monkeypatch):
+    last_day = FIRST_DAY + timedelta(days=DAYS - 1)
+    assert type(create_fare_ranking(DESTINATIONS, FIRST_DAY, last_day, engine="off")) is CheapestPerDestination
+
+    ranking = create_fare_ranking(DESTINATIONS, FIRST_DAY, last_day, engine="python")
+    assert isinstance(ranking.matrix, PythonFareMatrix)
+
+    monkeypatch.setattr("management.fare_matrix.np", None)
+    assert isinstance(create_fare_ranking(DESTINATIONS, FIRST_DAY, last_day, engine="auto").matrix, PythonFareMatrix)
+    with pytest.raises(RuntimeError):
+        create_fare_ranking(DESTINATIONS, FIRST_DAY, last_day, engine="numpy")
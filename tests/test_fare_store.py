@@ -0,0 +1,36 @@
+import asyncio
+import logging
+
+from management.fare_store import FareStore
+
+FLIGHTS = [("2030-05-10T06:00:00", 19.99)]
+
+
+def test_failed_background_flush_keeps_the_batch(tmp_path, monkeypatch, caplog):
+    store = FareStore(str(tmp_path / "fares.sqlite3"), max_age=3600, batch_size=2)
+    store.open()
+    write = store._write
+
+    def broken_write(pending):
+        raise OSError("disk I/O error")
+
+    monkeypatch.setattr(store, "_write", broken_write)
+
+    async def fill():
+        store.add_window("BER", "BCN", "2030-05-10", 2, 2, FLIGHTS)
+        store.add_window("BER", "ALC", "2030-05-10", 2, 2, FLIGHTS)
+        await asyncio.gather(*store._flush_tasks, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    with caplog.at_level(logging.ERROR, logger="management.fare_store"):
+        asyncio.run(fill())
+
+    assert "Fare store flush failed" in caplog.text
+    assert store.flushes == 0
+    assert store.get_window("BER", "BCN", "2030-05-10")[1] == FLIGHTS
+
+    monkeypatch.setattr(store, "_write", write)
+    store.close()
+    store.open()
+    assert store.get_window("BER", "ALC", "2030-05-10")[1] == FLIGHTS
+    store.close()
@@ -0,0 +1,40 @@
+import asyncio
+
+from aiohttp import web
+
+from management.http import start_http_session, get_http_session, close_http_session
+
+
+def test_requests_share_one_session_and_its_connections():
+    peers = []
+
+    async def handler(request):
+        peers.append(request.transport.get_extra_info("peername"))
+        return web.json_response({})
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_get("/", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        try:
+            session = await start_http_session()
+            assert get_http_session() is session
+            assert await start_http_session() is session
+            for _ in range(5):
+                async with get_http_session().get(f"http://127.0.0.1:{port}/") as response:
+                    await response.read()
+            await close_http_session()
+            assert session.closed
+            assert get_http_session() is not session
+            await close_http_session()
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(scenario())
+    # Sequential requests reuse the pooled keep-alive connection
+    assert len(peers) == 5
+    assert len(set(peers)) == 1
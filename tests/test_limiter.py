@@ -0,0 +1,132 @@
+import asyncio
+import time
+
+from management.limiter import AdaptiveConcurrencyLimiter, TokenBucket
+
+
+def test_limit_grows_by_about_one_per_round_and_halves_on_overload():
+    limiter = AdaptiveConcurrencyLimiter(initial=4, minimum=1, maximum=16, decrease_cooldown=60)
+    # About one slot per round of `limit` responses
+    for _ in range(5):
+        limiter.on_success()
+    assert limiter.limit == 5
+    for _ in range(200):
+        limiter.on_success()
+    assert limiter.limit == 16
+
+    limiter.on_overload()
+    assert limiter.limit == 8
+    # The rest of the burst falls into the cooldown
+    limiter.on_overload()
+    limiter.on_overload()
+    assert limiter.limit == 8
+    assert limiter.overloads == 3
+
+
+def test_limit_does_not_drop_below_the_minimum():
+    limiter = AdaptiveConcurrencyLimiter(initial=16, minimum=2, maximum=16, decrease_cooldown=0)
+    for _ in range(10):
+        limiter.on_overload()
+    assert limiter.limit == 2
+
+
+def test_in_flight_never_exceeds_the_limit():
+    limiter = AdaptiveConcurrencyLimiter(initial=3, minimum=1, maximum=3)
+    peak = 0
+
+    async def request():
+        nonlocal peak
+        async with limiter:
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.001)
+
+    async def scenario():
+        await asyncio.gather(*(request() for _ in range(30)))
+
+    asyncio.run(scenario())
+    assert peak == 3
+    assert limiter.in_flight == 0
+    assert limiter.stats()["waiting"] == 0
+
+
+def test_cancelled_waiter_does_not_leak_its_slot():
+    limiter = AdaptiveConcurrencyLimiter(initial=1, minimum=1, maximum=1)
+
+    async def scenario():
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        # The slot is handed to the waiter, which is cancelled before it runs
+        limiter.release()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert limiter.in_flight == 0
+        await asyncio.wait_for(limiter.acquire(), 1)
+
+    asyncio.run(scenario())
+    assert limiter.in_flight == 1
+
+
+def test_bucket_grants_the_burst_then_paces_at_the_rate():
+    bucket = TokenBucket(rate=200, burst=5)
+
+    async def scenario():
+        started = time.monotonic()
+        for _ in range(25):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    took = asyncio.run(scenario())
+    # 20 tokens past the burst at 200 per second
+    assert 0.08 <= took < 0.5
+    assert bucket.granted == 25
+
+
+def test_waiting_callers_are_served_round_robin():
+    bucket = TokenBucket(rate=500, burst=1)
+    order = []
+
+    async def request(name):
+        await bucket.acquire(caller=name)
+        order.append(name)
+
+    async def scenario():
+        await bucket.acquire()
+        sweep = [asyncio.create_task(request("sweep")) for _ in range(10)]
+        await asyncio.sleep(0)
+        # Queued behind ten sweep requests, the lookup still gets the second token
+        await asyncio.gather(request("lookup"), *sweep)
+
+    asyncio.run(scenario())
+    assert order.index("lookup") <= 1
+    assert len(order) == 11
+
+
+def test_sync_callers_and_disabled_bucket():
+    bucket = TokenBucket(rate=100, burst=2)
+    started = time.monotonic()
+    for _ in range(5):
+        bucket.acquire_sync()
+    assert time.monotonic() - started >= 0.025
+    assert bucket.granted == 5
+
+    disabled = TokenBucket(rate=0, burst=1)
+    for _ in range(100):
+        disabled.acquire_sync()
+    asyncio.run(disabled.acquire())
+    assert disabled.granted == 0
+
+
+def test_cancelled_waiter_gives_its_token_to_the_next():
+    bucket = TokenBucket(rate=100, burst=1)
+
+    async def scenario():
+        await bucket.acquire()
+        first = asyncio.create_task(bucket.acquire(caller="a"))
+        second = asyncio.create_task(bucket.acquire(caller="b"))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.wait_for(second, 1)
+
+    asyncio.run(scenario())
+    assert bucket.granted == 2
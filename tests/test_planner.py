@@ -0,0 +1,27 @@
+from datetime import date, timedelta
+
+import pytest
+
+from management.planner import plan_search_windows
+
+
+def window_days(window):
+    first = date.fromisoformat(window.first_day)
+    return [first + timedelta(days=offset) for offset in range(window.flex_before + window.flex_after + 1)]
+
+
+@pytest.mark.parametrize("flex_days", [0, 1, 2, 3])
+def test_windows_request_every_day_exactly_once(flex_days):
+    start = date(2030, 2, 20)
+    for length in range(1, 40):
+        end = start + timedelta(days=length - 1)
+        windows = plan_search_windows(start.isoformat(), end.isoformat(), flex_days)
+
+        days = [day for window in windows for day in window_days(window)]
+        assert days == [start + timedelta(days=offset) for offset in range(length)]
+        assert len(windows) == -(-length // (2 * flex_days + 1))
+        assert all(window.flex_before <= flex_days and window.flex_after <= flex_days for window in windows)
+
+
+def test_empty_range_has_no_windows():
+    assert plan_search_windows("2030-03-02", "2030-03-01") == []
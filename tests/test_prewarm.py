@@ -0,0 +1,80 @@
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+
+import management.prewarm as prewarm
+from management.cache import fare_cache
+from management.fare_index import FareIndex
+from management.flight import Flight
+from management.planner import plan_grid_windows
+from management.prewarm import FarePrewarmer
+
+
+def window_days(window):
+    return [date.fromisoformat(window.first_day) + timedelta(days=offset)
+            for offset in range(window.flex_before + window.flex_after + 1)]
+
+
+def test_grid_windows_tile_the_range_and_keep_their_keys():
+    today = date(2030, 5, 10)
+    windows = plan_grid_windows(today.isoformat(), (today + timedelta(days=90)).isoformat())
+    days = [day for window in windows for day in window_days(window)]
+    assert days == [today + timedelta(days=offset) for offset in range(len(days))]
+    assert days[-1] >= today + timedelta(days=90)
+
+    tomorrow = plan_grid_windows((today + timedelta(days=1)).isoformat(), (today + timedelta(days=91)).isoformat())
+    # Only the clipped first window may differ, everything after it is the same request
+    assert set(windows[1:]) <= set(tomorrow)
+
+
+def test_failed_refresh_is_not_marked_refreshed(monkeypatch):
+    async def refresh(origin, destination, window, ttl=None):
+        return None
+
+    monkeypatch.setattr(prewarm, "refresh_flights_async", refresh)
+    prewarmer = FarePrewarmer(rate=1000)
+
+    async def crawl():
+        prewarmer.start()
+        await asyncio.sleep(0.1)
+        await prewarmer.stop()
+
+    asyncio.run(crawl())
+    assert prewarmer.fetches > 0
+    assert prewarmer.status()["windows"] == 0
+
+
+def test_successful_refresh_is_kept_fresh_past_the_cache_ttl(monkeypatch):
+    async def refresh(origin, destination, window, ttl=None):
+        return []
+
+    monkeypatch.setattr(prewarm, "refresh_flights_async", refresh)
+    prewarmer = FarePrewarmer(rate=1000)
+
+    async def crawl():
+        prewarmer.start()
+        await asyncio.sleep(0.1)
+        await prewarmer.stop()
+
+    asyncio.run(crawl())
+    assert prewarmer.status()["windows"] == prewarmer.fetches
+    assert prewarmer.ttl(80) > prewarmer.refresh_interval(80)
+    assert prewarmer.ttl(3) >= fare_cache.ttl
+
+
+def test_next_job_idles_without_destinations(monkeypatch):
+    monkeypatch.setattr(prewarm, "get_popular_destinations_from_berlin", lambda: [])
+    assert FarePrewarmer().next_job(time.monotonic()) == FarePrewarmer.IDLE
+
+
+def test_window_max_age_overrides_the_index_default():
+    index = FareIndex(max_age=15 * 60)
+    now = time.time()
+    day = date.today() + timedelta(days=60)
+    flight = Flight("BER", "BCN", datetime.combine(day, datetime.min.time()), 20.0)
+    index.add_window("BER", "BCN", day.isoformat(), 2, 2, [flight], fetched_at=now, max_age=3 * 60 * 60)
+    index.add_window("BER", "ALC", day.isoformat(), 2, 2, [flight._replace(destination="ALC")], fetched_at=now)
+
+    later = now + 60 * 60
+    assert index.covers("BER", "BCN", day - timedelta(days=2), day + timedelta(days=2), now=later)
+    assert not index.covers("BER", "ALC", day - timedelta(days=2), day + timedelta(days=2), now=later)
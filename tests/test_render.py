@@ -0,0 +1,62 @@
+from datetime import datetime
+
+import pytest
+
+from management.flight import Flight
+from management.render import TELEGRAM_TEXT_LIMIT, format_flight, page_keyboard, paginate, utf16_len
+
+
+def test_utf16_len_counts_emoji_twice():
+    assert utf16_len("abc") == 3
+    assert utf16_len("ціна") == 4
+    assert utf16_len("🛫") == 2
+
+
+@pytest.mark.parametrize("entry_size", [100, 700, 1500])
+def test_pages_fit_the_limit_in_utf16_units(entry_size):
+    # Emoji-heavy entries are twice as long in UTF-16 as in characters
+    entries = [f"{number:03d}" + "🔥" * entry_size for number in range(23)]
+    header = "🔥 Найдешевші рейси\n\n"
+    pages = paginate(header, entries, per_page=5)
+
+    assert all(utf16_len(page) <= TELEGRAM_TEXT_LIMIT for page in pages)
+    assert all(page.startswith(header) for page in pages)
+    # Every entry on exactly one page, in order
+    found = [entry for page in pages for entry in entries if entry in page]
+    assert found == entries
+    if len(pages) > 1:
+        assert pages[-1].endswith(f"Сторінка {len(pages)}/{len(pages)}")
+
+
+def test_page_is_filled_up_to_the_limit():
+    header = "header\n\n"
+    footer = utf16_len("\n\nСторінка 999/999")
+    size = (TELEGRAM_TEXT_LIMIT - utf16_len(header) - footer - 2) // 2
+    pages = paginate(header, ["x" * size, "y" * size, "z"], per_page=5)
+    assert len(pages) == 2
+    assert "y" * size in pages[0] and pages[1].startswith(header + "z")
+
+    pages = paginate(header, ["x" * size, "y" * (size + 1), "z"], per_page=5)
+    assert len(pages) == 2
+    assert "y" * size not in pages[0]
+
+
+def test_single_page_and_empty_results():
+    assert paginate("header\n\n", ["a", "b"]) == ["header\n\na\n\nb"]
+    assert paginate("header\n\n", []) == ["header\n\n"]
+
+
+def test_page_keyboard():
+    assert page_keyboard(0, 1) is None
+    first = [button.callback_data for button in page_keyboard(0, 3).inline_keyboard[0]]
+    middle = [button.callback_data for button in page_keyboard(1, 3).inline_keyboard[0]]
+    last = [button.callback_data for button in page_keyboard(2, 3).inline_keyboard[0]]
+    assert (first, middle, last) == (["page_1"], ["page_0", "page_2"], ["page_1"])
+
+
+def test_format_flight_drops_empty_link_parameters():
+    flight = Flight("BER", "BCN", datetime(2030, 5, 4, 6, 30), 19.99, "Барселона")
+    text = format_flight(flight)
+    assert text.startswith("🛫 Барселона\n💰 Ціна: 19.99€\n📅 Дата: 04.05.2030, 06:30")
+    assert "dateOut=2030-05-04" in text and "dateIn" not in text and "promoCode" not in text
+    assert "🛫" not in format_flight(flight, show_city=False)
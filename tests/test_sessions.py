@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+import pytest
+
+import management.sessions as sessions
+from management.sessions import Session, SessionStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sessions, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def test_live_count_drops_idle_sessions(clock):
+    store = SessionStore(max_entries=10, idle_ttl=60)
+    store.set(1, Session())
+    clock.now += 30
+    store.set(2, Session())
+
+    clock.now += 45
+    assert len(store) == 2  # the idle session is still held until something expires it
+    assert store.live_count() == 1
+    assert store.expired == 1
+
+
+def test_access_keeps_a_session_alive(clock):
+    store = SessionStore(max_entries=10, idle_ttl=60)
+    session = store.set(1, Session(city="BCN"))
+    for _ in range(5):
+        clock.now += 50
+        assert store.get(1) is session
+
+    clock.now += 60
+    assert store.get(1) is None
+    assert store.get_or_create(1).city is None
+    assert store.expired == 1
+
+
+def test_least_recently_used_session_is_evicted(clock):
+    store = SessionStore(max_entries=3, idle_ttl=60)
+    for user_id in range(3):
+        store.set(user_id, Session())
+        clock.now += 1
+    store.get(0)
+    store.set(3, Session())
+
+    assert store.get(1) is None
+    assert all(store.get(user_id) is not None for user_id in (0, 2, 3))
+    assert store.stats() == {"sessions": 3, "max_entries": 3, "evicted": 1, "expired": 0}
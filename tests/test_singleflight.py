@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from management.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    runs = 0
+
+    async def work():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.01)
+        return runs
+
+    async def scenario():
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+        assert flight.in_flight() == 0
+        # A call after the first finished starts a new run
+        return results, await flight.do("key", work)
+
+    results, later = asyncio.run(scenario())
+    assert results == [1] * 5
+    assert later == 2
+    assert (flight.started, flight.shared) == (2, 4)
+
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def scenario():
+        first = asyncio.create_task(flight.do("key", work))
+        second = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(scenario()) == "done"
+
+
+def test_every_caller_gets_the_error():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream")
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_late_stream_subscribers_replay_the_items_so_far():
+    flight = SingleFlight()
+    runs = 0
+
+    async def scenario():
+        halfway = asyncio.Event()
+        resume = asyncio.Event()
+
+        async def produce():
+            nonlocal runs
+            runs += 1
+            yield 0
+            yield 1
+            halfway.set()
+            await resume.wait()
+            yield 2
+            yield 3
+
+        async def consume():
+            return [item async for item in flight.stream("key", produce)]
+
+        first = asyncio.create_task(consume())
+        await halfway.wait()
+        second = asyncio.create_task(consume())
+        await asyncio.sleep(0)
+        resume.set()
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(scenario()) == [[0, 1, 2, 3], [0, 1, 2, 3]]
+    assert runs == 1
+    assert (flight.started, flight.shared) == (1, 1)
+
+
+def test_stream_error_reaches_every_subscriber():
+    flight = SingleFlight()
+
+    async def produce():
+        yield 1
+        raise ValueError("upstream")
+
+    async def consume():
+        items = []
+        with pytest.raises(ValueError):
+            async for item in flight.stream("key", produce):
+                items.append(item)
+        return items
+
+    async def scenario():
+        return await asyncio.gather(consume(), consume())
+
+    assert asyncio.run(scenario()) == [[1], [1]]
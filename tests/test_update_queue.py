@@ -0,0 +1,43 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from management.update_queue import UpdateQueue
+
+
+def test_stop_finishes_acknowledged_updates_and_refuses_new_ones():
+    handled = []
+
+    async def handler(update):
+        await asyncio.sleep(0.01)
+        handled.append(update.update_id)
+
+    async def scenario():
+        queue = UpdateQueue(handler, workers=2, max_size=10)
+        queue.start()
+        assert all(queue.submit(SimpleNamespace(update_id=number)) for number in range(6))
+        await queue.stop(timeout=5)
+        return queue, queue.submit(SimpleNamespace(update_id=100))
+
+    queue, accepted = asyncio.run(scenario())
+    assert sorted(handled) == list(range(6))
+    assert not accepted
+    assert queue.stats()["processed"] == 6
+
+
+def test_stop_gives_up_on_updates_after_the_timeout():
+    async def handler(update):
+        await asyncio.sleep(60)
+
+    async def scenario():
+        queue = UpdateQueue(handler, workers=1, max_size=10)
+        queue.start()
+        queue.submit(SimpleNamespace(update_id=1))
+        queue.submit(SimpleNamespace(update_id=2))
+        started = time.monotonic()
+        await queue.stop(timeout=0.05)
+        return queue, time.monotonic() - started
+
+    queue, took = asyncio.run(scenario())
+    assert took < 1
+    assert queue.stats()["processed"] == 0